@@ -4,88 +4,331 @@ Combines data from multiple sources for comprehensive stock analysis
 """
 
 import os
+import math
+import time
 import asyncio
-from typing import List, Dict
+from typing import Awaitable, Callable, List, Dict, Optional
 from datetime import datetime
+import numpy as np
 
 # Import individual data sources
 from .yahoo import YahooFinanceSource
 from .finnhub import FinnhubSource
 from .alpha_vantage import AlphaVantageSource
 from .news import NewsSource
+from .cache import cacheable
+
+
+def _score(change_pct: float, rsi: float, volume: float, avg_volume: float,
+           sentiment: float, news_count: float, pe_ratio: float) -> tuple:
+    """
+    Opportunity score math over plain floats.
+    NaN marks a missing sentiment or pe_ratio.
+    Returns (momentum, volume, sentiment, value, overall).
+    """
+    # === Momentum Score ===
+    # Positive momentum if price up and RSI not overbought
+    momentum = 50.0
+    if change_pct > 0 and rsi < 70:
+        momentum = min(50 + (change_pct * 5) + ((70 - rsi) / 2), 100.0)
+    elif change_pct < 0 and rsi > 30:
+        momentum = max(50 + (change_pct * 5) - ((rsi - 30) / 2), 0.0)
+
+    # === Volume Score ===
+    # High volume = something is happening
+    volume_score = 50.0
+    if avg_volume > 0:
+        volume_ratio = volume / avg_volume
+        if volume_ratio > 2:
+            volume_score = min(70 + (volume_ratio * 5), 100.0)
+        elif volume_ratio > 1:
+            volume_score = 50 + (volume_ratio * 10)
+        else:
+            volume_score = volume_ratio * 50
+
+    # === Sentiment Score ===
+    sentiment_score = 50.0
+    if not math.isnan(sentiment):
+        sentiment_score = max(min(sentiment * 100, 100.0), 0.0)
+    # News-based sentiment boost: more news = more interest
+    if news_count > 0:
+        sentiment_score = min(sentiment_score + news_count * 2, 100.0)
+
+    # === Value Score ===
+    # Lower P/E is generally better (for value)
+    value = 50.0
+    if not math.isnan(pe_ratio):
+        if pe_ratio < 15:
+            value = 80.0
+        elif pe_ratio < 25:
+            value = 60.0
+        elif pe_ratio < 40:
+            value = 40.0
+        else:
+            value = 20.0
+
+    # Overall score (weighted average)
+    overall = (momentum * 0.25 + volume_score * 0.25 +
+               sentiment_score * 0.25 + value * 0.25)
+
+    return momentum, volume_score, sentiment_score, value, overall
+
+
+def _score_batch(change_pct: np.ndarray, rsi: np.ndarray, volume: np.ndarray,
+                 avg_volume: np.ndarray, sentiment: np.ndarray, news_count: np.ndarray,
+                 pe_ratio: np.ndarray) -> tuple:
+    """
+    Vectorized _score over equal-length float64 arrays, one element per ticker.
+    Returns (momentum, volume, sentiment, value, overall) arrays.
+    """
+    # === Momentum Score ===
+    up = (change_pct > 0) & (rsi < 70)
+    down = ~up & (change_pct < 0) & (rsi > 30)
+    momentum = np.select(
+        [up, down],
+        [np.minimum(50 + change_pct * 5 + (70 - rsi) / 2, 100),
+         np.maximum(50 + change_pct * 5 - (rsi - 30) / 2, 0)],
+        default=50.0
+    )
+
+    # === Volume Score ===
+    has_avg = avg_volume > 0
+    ratio = np.divide(volume, avg_volume, out=np.zeros_like(volume), where=has_avg)
+    volume_score = np.select(
+        [~has_avg, ratio > 2, ratio > 1],
+        [50.0, np.minimum(70 + ratio * 5, 100), 50 + ratio * 10],
+        default=ratio * 50
+    )
+
+    # === Sentiment Score ===
+    sentiment_score = np.where(np.isnan(sentiment), 50.0, np.clip(sentiment * 100, 0, 100))
+    sentiment_score = np.where(news_count > 0,
+                               np.minimum(sentiment_score + news_count * 2, 100),
+                               sentiment_score)
+
+    # === Value Score ===
+    value = np.select(
+        [np.isnan(pe_ratio), pe_ratio < 15, pe_ratio < 25, pe_ratio < 40],
+        [50.0, 80.0, 60.0, 40.0],
+        default=20.0
+    )
+
+    overall = (momentum * 0.25 + volume_score * 0.25 +
+               sentiment_score * 0.25 + value * 0.25)
+
+    return momentum, volume_score, sentiment_score, value, overall
+
+
+async def _bounded(coro: Awaitable, timeout: float):
+    """Await coro with a deadline, returning the exception instead of raising"""
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except Exception as e:
+        return e
+
+
+# (combined key, Finnhub quote key) - Finnhub is the primary price source
+_FINNHUB_FIELDS = (
+    ("price", "current"),
+    ("change", "change"),
+    ("change_pct", "change_pct"),
+    ("analyst_rating", "analyst_rating"),
+    ("target_price", "target_price"),
+    ("sentiment_score", "sentiment_score"),
+)
+# Yahoo price fields, only used when Finnhub has no price
+_YAHOO_PRICE_FIELDS = ("price", "change", "change_pct")
+# Yahoo fundamentals with their defaults, always used when available
+_YAHOO_FIELDS = {
+    "volume": 0,
+    "avg_volume": 0,
+    "market_cap": 0,
+    "pe_ratio": None,
+    "high_52w": None,
+    "low_52w": None,
+    "name": None,
+}
+
+
+def _combine_source_data(ticker: str, yahoo_data, finnhub_data, news_data,
+                         timestamp: str) -> Dict:
+    """Merge per-source results for one ticker into a single record"""
+    combined = {
+        "ticker": ticker,
+        "timestamp": timestamp
+    }
+
+    # Finnhub data (PRIMARY source for price - more reliable than Yahoo in serverless)
+    if isinstance(finnhub_data, dict) and finnhub_data.get("current", 0) > 0:
+        combined |= {key: finnhub_data.get(src) for key, src in _FINNHUB_FIELDS}
+
+    # Yahoo data (supplementary - fundamentals, fallback for price)
+    if isinstance(yahoo_data, dict):
+        if combined.get("price", 0) == 0 and yahoo_data.get("price", 0) > 0:
+            combined |= {key: yahoo_data.get(key) for key in _YAHOO_PRICE_FIELDS}
+        combined |= {key: yahoo_data.get(key, default) for key, default in _YAHOO_FIELDS.items()}
+        combined["name"] = combined["name"] or ticker
+
+    # News headlines
+    if isinstance(news_data, list):
+        combined["news"] = news_data[:5]  # Top 5 headlines
+
+    return combined
 
 
 class DataAggregator:
     """Aggregates data from multiple sources"""
 
+    # Cache lifetimes in seconds - quotes move faster than headlines
+    QUOTE_TTL = 60
+    NEWS_TTL = 15 * 60
+
+    # Per-source deadlines in seconds so one stuck upstream can't stall a ticker.
+    # Yahoo may fall back to several sequential requests per quote, so it gets more room.
+    YAHOO_TIMEOUT = 4.0
+    FINNHUB_TIMEOUT = 2.0
+    NEWS_TIMEOUT = 3.0
+
     def __init__(self):
         self.yahoo = YahooFinanceSource()
         self.finnhub = FinnhubSource(api_key=os.getenv("FINNHUB_API_KEY"))
         self.alpha_vantage = AlphaVantageSource(api_key=os.getenv("ALPHA_VANTAGE_API_KEY"))
         self.news = NewsSource()
+        self._cache: Dict[str, tuple] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Yahoo quote fetches in progress, by ticker, and the tasks running them
+        self._yahoo_inflight: Dict[str, asyncio.Future] = {}
+        self._background = set()
 
-    async def get_stock_data(self, tickers: List[str]) -> Dict:
-        """Get comprehensive data for multiple tickers"""
-        results = {}
+    async def aclose(self):
+        """Release pooled HTTP connections held by the sources"""
+        await asyncio.gather(
+            self.yahoo.aclose(), self.finnhub.aclose(),
+            self.alpha_vantage.aclose(), self.news.aclose()
+        )
+
+    async def warmup(self, timeout: float = 5.0):
+        """Pre-connect every source's HTTP client, bounded so startup never stalls"""
+        try:
+            await asyncio.wait_for(asyncio.gather(
+                self.yahoo.warmup(), self.finnhub.warmup(),
+                self.alpha_vantage.warmup(), self.news.warmup()
+            ), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _cached(self, key: str, ttl: float, coro_factory: Callable[[], Awaitable]):
+        """Serve a source call from cache, collapsing concurrent misses into one fetch"""
+        entry = self._cache.get(key)
+        if entry and time.monotonic() - entry[0] < ttl:
+            return entry[1]
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another caller may have filled the cache while we waited
+            entry = self._cache.get(key)
+            if entry and time.monotonic() - entry[0] < ttl:
+                return entry[1]
 
+            value = await coro_factory()
+            # Don't pin failures (error results, empty news) in the cache
+            if cacheable(value):
+                self._cache[key] = (time.monotonic(), value)
+            return value
+
+    async def _yahoo_quotes(self, tickers: List[str]) -> Dict[str, object]:
+        """
+        Yahoo quotes by ticker, each waited on for at most YAHOO_TIMEOUT (a
+        timed-out ticker maps to the exception). Cache misses go out as one
+        background bulk fetch that caches each quote as it arrives, and a
+        ticker already being fetched waits on that fetch instead of starting
+        another.
+        """
+        now = time.monotonic()
+        quotes = {}
+        waiting = {}
+        started = {}
         for ticker in tickers:
-            try:
-                # Get data from multiple sources in parallel
-                yahoo_data, finnhub_data, news_data = await asyncio.gather(
-                    self.yahoo.get_quote(ticker),
-                    self.finnhub.get_quote(ticker),
-                    self.news.get_news(ticker),
-                    return_exceptions=True
-                )
+            entry = self._cache.get(f"yahoo:{ticker}")
+            if entry and now - entry[0] < self.QUOTE_TTL:
+                quotes[ticker] = entry[1]
+            elif ticker in self._yahoo_inflight:
+                waiting[ticker] = self._yahoo_inflight[ticker]
+            else:
+                future = asyncio.get_running_loop().create_future()
+                waiting[ticker] = started[ticker] = self._yahoo_inflight[ticker] = future
 
-                # Combine data (prefer Finnhub for price - more reliable in serverless)
-                combined = {
-                    "ticker": ticker,
-                    "timestamp": datetime.now().isoformat()
-                }
+        if started:
+            task = asyncio.create_task(self._fetch_yahoo(started))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+        if waiting:
+            # shield() so a waiter's deadline doesn't cancel the shared fetch
+            values = await asyncio.gather(*(
+                _bounded(asyncio.shield(future), self.YAHOO_TIMEOUT)
+                for future in waiting.values()
+            ))
+            quotes.update(zip(waiting, values))
+
+        return quotes
 
-                # Finnhub data (PRIMARY source for price - more reliable than Yahoo in serverless)
-                if isinstance(finnhub_data, dict) and finnhub_data.get("current", 0) > 0:
-                    combined.update({
-                        "price": finnhub_data.get("current", 0),
-                        "change": finnhub_data.get("change", 0),
-                        "change_pct": finnhub_data.get("change_pct", 0),
-                        "analyst_rating": finnhub_data.get("analyst_rating"),
-                        "target_price": finnhub_data.get("target_price"),
-                        "sentiment_score": finnhub_data.get("sentiment_score")
-                    })
-
-                # Yahoo data (supplementary - fundamentals, fallback for price)
-                if isinstance(yahoo_data, dict):
-                    # Only use Yahoo price if Finnhub failed
-                    if combined.get("price", 0) == 0 and yahoo_data.get("price", 0) > 0:
-                        combined.update({
-                            "price": yahoo_data.get("price", 0),
-                            "change": yahoo_data.get("change", 0),
-                            "change_pct": yahoo_data.get("change_pct", 0),
-                        })
-                    # Always use Yahoo for fundamentals (if available)
-                    combined.update({
-                        "volume": yahoo_data.get("volume", 0),
-                        "avg_volume": yahoo_data.get("avg_volume", 0),
-                        "market_cap": yahoo_data.get("market_cap", 0),
-                        "pe_ratio": yahoo_data.get("pe_ratio"),
-                        "high_52w": yahoo_data.get("high_52w"),
-                        "low_52w": yahoo_data.get("low_52w"),
-                        "name": yahoo_data.get("name", ticker)
-                    })
-
-                # News headlines
-                if isinstance(news_data, list):
-                    combined["news"] = news_data[:5]  # Top 5 headlines
-
-                results[ticker] = combined
+    async def _fetch_yahoo(self, futures: Dict[str, asyncio.Future]):
+        """Bulk-fetch Yahoo quotes, caching and releasing each ticker as it lands"""
+        def ready(ticker: str, quote: Dict):
+            if cacheable(quote):
+                self._cache[f"yahoo:{ticker}"] = (time.monotonic(), quote)
+            if self._yahoo_inflight.get(ticker) is futures[ticker]:
+                del self._yahoo_inflight[ticker]
+            if not futures[ticker].done():
+                futures[ticker].set_result(quote)
 
+        error = "No Yahoo quote returned"
+        try:
+            await self.yahoo.get_quotes_bulk(list(futures), on_quote=ready)
+        except Exception as e:
+            error = str(e)
+        # Release anyone still waiting on a ticker the fetch never produced
+        for ticker, future in futures.items():
+            if not future.done():
+                ready(ticker, {"error": error, "ticker": ticker})
+
+    async def get_stock_data(self, tickers: List[str]) -> Dict:
+        """Get comprehensive data for multiple tickers"""
+        # Fan out every source for every ticker at once; Yahoo quotes go
+        # out as one bulk request for the whole batch, bounded per ticker
+        yahoo_quotes, per_ticker = await asyncio.gather(
+            self._yahoo_quotes(tickers),
+            asyncio.gather(*[
+                asyncio.gather(
+                    _bounded(self._cached(f"finnhub:{ticker}", self.QUOTE_TTL,
+                                          lambda t=ticker: self.finnhub.get_quote(t)),
+                             self.FINNHUB_TIMEOUT),
+                    _bounded(self._cached(f"news:{ticker}", self.NEWS_TTL,
+                                          lambda t=ticker: self.news.get_news(t)),
+                             self.NEWS_TIMEOUT)
+                )
+                for ticker in tickers
+            ])
+        )
+        all_results = [
+            (yahoo_quotes.get(ticker), finnhub_data, news_data)
+            for ticker, (finnhub_data, news_data) in zip(tickers, per_ticker)
+        ]
+
+        # One timestamp for the whole batch
+        timestamp = datetime.now().isoformat()
+        results = {}
+        for ticker, (yahoo_data, finnhub_data, news_data) in zip(tickers, all_results):
+            try:
+                results[ticker] = _combine_source_data(
+                    ticker, yahoo_data, finnhub_data, news_data, timestamp
+                )
             except Exception as e:
                 results[ticker] = {
                     "ticker": ticker,
                     "error": str(e),
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": timestamp
                 }
 
         return results
@@ -107,88 +350,20 @@ class DataAggregator:
             # Get technical indicators
             technicals = await self.alpha_vantage.get_technicals(ticker)
 
-            scores = {
-                "momentum": 50,
-                "volume": 50,
-                "sentiment": 50,
-                "value": 50
-            }
-
-            # === Momentum Score ===
-            # Based on price change and RSI
-            change_pct = data.get("change_pct", 0)
             rsi = technicals.get("rsi", 50)
-
-            # Positive momentum if price up and RSI not overbought
-            if change_pct > 0 and rsi < 70:
-                scores["momentum"] = min(50 + (change_pct * 5) + ((70 - rsi) / 2), 100)
-            elif change_pct < 0 and rsi > 30:
-                scores["momentum"] = max(50 + (change_pct * 5) - ((rsi - 30) / 2), 0)
-
-            # === Volume Score ===
-            # High volume = something is happening
-            volume = data.get("volume", 0)
-            avg_volume = data.get("avg_volume", 1)
-
-            if avg_volume > 0:
-                volume_ratio = volume / avg_volume
-                if volume_ratio > 2:
-                    scores["volume"] = min(70 + (volume_ratio * 5), 100)
-                elif volume_ratio > 1:
-                    scores["volume"] = 50 + (volume_ratio * 10)
-                else:
-                    scores["volume"] = volume_ratio * 50
-
-            # === Sentiment Score ===
             sentiment = data.get("sentiment_score")
-            if sentiment is not None:
-                scores["sentiment"] = max(min(sentiment * 100, 100), 0)
-
-            # News-based sentiment boost
-            news = data.get("news", [])
-            if news:
-                # Simple: more news = more interest
-                scores["sentiment"] = min(scores["sentiment"] + len(news) * 2, 100)
-
-            # === Value Score ===
             pe_ratio = data.get("pe_ratio")
-            if pe_ratio:
-                # Lower P/E is generally better (for value)
-                if pe_ratio < 15:
-                    scores["value"] = 80
-                elif pe_ratio < 25:
-                    scores["value"] = 60
-                elif pe_ratio < 40:
-                    scores["value"] = 40
-                else:
-                    scores["value"] = 20
-
-            # Calculate overall score (weighted average)
-            overall = (
-                scores["momentum"] * 0.25 +
-                scores["volume"] * 0.25 +
-                scores["sentiment"] * 0.25 +
-                scores["value"] * 0.25
-            )
 
-            return {
-                "ticker": ticker,
-                "overall_score": round(overall),
-                "breakdown": {
-                    "momentum": round(scores["momentum"]),
-                    "volume": round(scores["volume"]),
-                    "sentiment": round(scores["sentiment"]),
-                    "value": round(scores["value"])
-                },
-                "data": {
-                    "price": data.get("price"),
-                    "change_pct": change_pct,
-                    "volume_ratio": round(volume / avg_volume, 2) if avg_volume > 0 else 0,
-                    "rsi": rsi,
-                    "pe_ratio": pe_ratio
-                },
-                "timestamp": datetime.now().isoformat()
-            }
+            scores = _score(
+                float(data.get("change_pct", 0) or 0),
+                float(rsi if rsi is not None else 50),
+                float(data.get("volume", 0) or 0),
+                float(data.get("avg_volume", 1) or 0),
+                float(sentiment) if sentiment is not None else math.nan,
+                float(len(data.get("news", []))),
+                float(pe_ratio) if pe_ratio else math.nan
+            )
+            return self._score_result(ticker, data, rsi, scores)
 
         except Exception as e:
             return {
@@ -197,12 +372,90 @@ class DataAggregator:
                 "overall_score": 0
             }
 
+    def _score_result(self, ticker: str, data: Dict, rsi, scores) -> Dict:
+        """Shape a (momentum, volume, sentiment, value, overall) score for the API"""
+        momentum, volume_score, sentiment_score, value, overall = scores
+        volume = data.get("volume", 0)
+        avg_volume = data.get("avg_volume", 1)
+
+        return {
+            "ticker": ticker,
+            "overall_score": round(overall),
+            "breakdown": {
+                "momentum": round(momentum),
+                "volume": round(volume_score),
+                "sentiment": round(sentiment_score),
+                "value": round(value)
+            },
+            "data": {
+                "price": data.get("price"),
+                "change_pct": data.get("change_pct", 0),
+                "volume_ratio": round(volume / avg_volume, 2) if avg_volume and avg_volume > 0 else 0,
+                "rsi": rsi,
+                "pe_ratio": data.get("pe_ratio")
+            },
+            "timestamp": datetime.now().isoformat()
+        }
+
     async def scan_opportunities(self, price_min: float = 4, price_max: float = 10,
-                                  limit: int = 10) -> List[Dict]:
+                                  limit: int = 10,
+                                  tickers: Optional[List[str]] = None) -> List[Dict]:
         """
         Scan for stock opportunities in a price range
         Returns top opportunities by score
         """
-        # This would require a stock screener API
-        # For now, return empty - user adds stocks manually
-        return []
+        # There is no screener API yet - callers supply the universe to scan
+        if not tickers:
+            return []
+
+        stock_data = await self.get_stock_data(tickers)
+        candidates = [
+            t for t in tickers
+            if price_min <= (stock_data.get(t, {}).get("price", 0) or 0) <= price_max
+        ]
+        if not candidates:
+            return []
+
+        results = await self._score_fetched(candidates, stock_data)
+        # Highest overall score first
+        results.sort(key=lambda r: r["overall_score"], reverse=True)
+        return results[:limit]
+
+    async def calculate_opportunity_scores(self, tickers: List[str]) -> List[Dict]:
+        """
+        Batch version of calculate_opportunity_score - one get_stock_data
+        call and one vectorized scoring pass for all tickers
+        """
+        if not tickers:
+            return []
+
+        stock_data = await self.get_stock_data(tickers)
+        return await self._score_fetched(tickers, stock_data)
+
+    async def _score_fetched(self, tickers: List[str], stock_data: Dict) -> List[Dict]:
+        """Fetch technicals concurrently and score already-fetched stock data"""
+        technicals = await asyncio.gather(
+            *(self.alpha_vantage.get_technicals(t) for t in tickers)
+        )
+        rsis = [tech.get("rsi", 50) for tech in technicals]
+
+        def column(values) -> np.ndarray:
+            return np.fromiter(values, dtype=np.float64, count=len(tickers))
+
+        rows = [stock_data.get(t, {}) for t in tickers]
+        batch = _score_batch(
+            column(d.get("change_pct", 0) or 0 for d in rows),
+            column(r if r is not None else 50 for r in rsis),
+            column(d.get("volume", 0) or 0 for d in rows),
+            column(d.get("avg_volume", 1) or 0 for d in rows),
+            column(d["sentiment_score"] if d.get("sentiment_score") is not None else math.nan
+                   for d in rows),
+            column(len(d.get("news", [])) for d in rows),
+            column(d.get("pe_ratio") or math.nan for d in rows)
+        )
+
+        return [
+            self._score_result(ticker, rows[i], rsis[i],
+                               tuple(float(col[i]) for col in batch))
+            for i, ticker in enumerate(tickers)
+        ]
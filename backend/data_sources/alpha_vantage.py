@@ -3,8 +3,55 @@ Stockman - Alpha Vantage Data Source
 Technical indicators and additional market data
 """
 
+import asyncio
 import httpx
+import orjson
+from bisect import bisect_left, bisect_right
 from typing import Dict, Optional
+from .cache import dedupe, ttl_cache
+from .ratelimit import TokenBucket
+
+# Cache lifetimes in seconds
+QUOTE_TTL = 15
+TECHNICALS_TTL = 5 * 60
+OVERVIEW_TTL = 24 * 60 * 60
+
+# Longest to wait for a rate-limit token before failing the call; a free
+# token otherwise takes 12s to refill
+RATE_LIMIT_WAIT = 2.0
+
+# Keys Alpha Vantage uses for throttling notices and request errors
+_ERROR_KEYS = ("Note", "Information", "Error Message")
+
+# RSI buckets: <=30 Oversold, <=40 Bearish, >=60 Bullish, >=70 Overbought
+_RSI_LOWER = (30, 40)
+_RSI_UPPER = (60, 70)
+_RSI_LABELS = ("Oversold", "Bearish", "Neutral", "Bullish", "Overbought")
+# Indexed by (sma_20 > sma_50) + 2 * (sma_20 < sma_50)
+_TREND_LABELS = ("Sideways", "Uptrend", "Downtrend")
+
+# (overview key, Alpha Vantage OVERVIEW field) for numeric values
+_NUMERIC_OVERVIEW_FIELDS = (
+    ("market_cap", "MarketCapitalization"),
+    ("pe_ratio", "PERatio"),
+    ("peg_ratio", "PEGRatio"),
+    ("book_value", "BookValue"),
+    ("dividend_yield", "DividendYield"),
+    ("eps", "EPS"),
+    ("revenue_ttm", "RevenueTTM"),
+    ("profit_margin", "ProfitMargin"),
+    ("52_week_high", "52WeekHigh"),
+    ("52_week_low", "52WeekLow"),
+    ("analyst_target", "AnalystTargetPrice"),
+)
+
+
+def _to_float(value) -> Optional[float]:
+    """Parse an Alpha Vantage numeric string, None if missing or malformed"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
 
 
 class AlphaVantageSource:
@@ -14,46 +61,97 @@ class AlphaVantageSource:
 
     def __init__(self, api_key: str):
         self.api_key = api_key
+        # One pooled HTTP/2 client so concurrent calls multiplex on a
+        # kept-alive connection, with compressed JSON responses
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=10.0,
+            headers={"Accept-Encoding": "gzip, br"},
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        # Free tier allows 5 requests per minute
+        self._semaphore = asyncio.Semaphore(5)
+        self._bucket = TokenBucket(rate=5 / 60, capacity=5)
 
+    async def aclose(self):
+        """Close the pooled HTTP client"""
+        await self._client.aclose()
+
+    async def warmup(self):
+        """Open a connection ahead of the first request so it skips the TLS handshake"""
+        try:
+            await self._client.head(self.BASE_URL)
+        except httpx.HTTPError:
+            pass
+
+    async def _get(self, url: str, params: Dict) -> httpx.Response:
+        """GET within the provider's concurrency and rate limits"""
+        async with self._semaphore:
+            try:
+                await asyncio.wait_for(self._bucket.take(), RATE_LIMIT_WAIT)
+            except asyncio.TimeoutError:
+                raise RuntimeError("Alpha Vantage rate limit reached") from None
+            return await self._client.get(url, params=params)
+
+    async def _get_json(self, params: Dict) -> Dict:
+        """
+        GET and parse a query. Throttling and bad requests come back as
+        HTTP 200 with a Note/Information/Error Message body, so those raise
+        too instead of parsing as empty data.
+        """
+        response = await self._get(self.BASE_URL, params)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        for key in _ERROR_KEYS:
+            if key in data:
+                raise ValueError(data[key])
+        return data
+
+    @ttl_cache(QUOTE_TTL)
+    @dedupe
     async def get_quote(self, ticker: str) -> Dict:
         """Get global quote"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    self.BASE_URL,
-                    params={
-                        "function": "GLOBAL_QUOTE",
-                        "symbol": ticker,
-                        "apikey": self.api_key
-                    },
-                    timeout=10.0
-                )
-                data = response.json()
-                quote = data.get("Global Quote", {})
-
-                return {
-                    "ticker": ticker,
-                    "price": float(quote.get("05. price", 0)),
-                    "change": float(quote.get("09. change", 0)),
-                    "change_pct": quote.get("10. change percent", "0%").replace("%", ""),
-                    "volume": int(quote.get("06. volume", 0)),
-                    "previous_close": float(quote.get("08. previous close", 0))
+            data = await self._get_json(
+                {
+                    "function": "GLOBAL_QUOTE",
+                    "symbol": ticker,
+                    "apikey": self.api_key
                 }
+            )
+            quote = data.get("Global Quote", {})
+
+            return {
+                "ticker": ticker,
+                "price": float(quote.get("05. price", 0)),
+                "change": float(quote.get("09. change", 0)),
+                "change_pct": quote.get("10. change percent", "0%").replace("%", ""),
+                "volume": int(quote.get("06. volume", 0)),
+                "previous_close": float(quote.get("08. previous close", 0))
+            }
 
         except Exception as e:
             return {"ticker": ticker, "error": str(e)}
 
+    @ttl_cache(TECHNICALS_TTL)
     async def get_technicals(self, ticker: str) -> Dict:
         """Get technical indicators (RSI, SMA, etc.)"""
         try:
-            # Get RSI
-            rsi_data = await self._get_rsi(ticker)
+            # RSI plus 20-day and 50-day SMA, fetched concurrently
+            rsi_data, sma_20, sma_50 = await asyncio.gather(
+                self._get_rsi(ticker),
+                self._get_sma(ticker, 20),
+                self._get_sma(ticker, 50),
+                return_exceptions=True
+            )
+            if isinstance(rsi_data, Exception):
+                rsi_data = {"rsi": 50, "error": str(rsi_data)}
+            if isinstance(sma_20, Exception):
+                sma_20 = {"sma": None, "error": str(sma_20)}
+            if isinstance(sma_50, Exception):
+                sma_50 = {"sma": None, "error": str(sma_50)}
 
-            # Get SMA (20-day and 50-day)
-            sma_20 = await self._get_sma(ticker, 20)
-            sma_50 = await self._get_sma(ticker, 50)
-
-            return {
+            technicals = {
                 "ticker": ticker,
                 "rsi": rsi_data.get("rsi"),
                 "sma_20": sma_20.get("sma"),
@@ -61,65 +159,64 @@ class AlphaVantageSource:
                 "rsi_signal": self._interpret_rsi(rsi_data.get("rsi")),
                 "trend": self._interpret_trend(sma_20.get("sma"), sma_50.get("sma"))
             }
+            # Surface a failed indicator so the fallback values aren't cached
+            errors = [part["error"] for part in (rsi_data, sma_20, sma_50) if "error" in part]
+            if errors:
+                technicals["error"] = "; ".join(errors)
+            return technicals
 
         except Exception as e:
             return {"ticker": ticker, "error": str(e), "rsi": 50}
 
+    @dedupe
     async def _get_rsi(self, ticker: str, period: int = 14) -> Dict:
         """Get RSI indicator"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    self.BASE_URL,
-                    params={
-                        "function": "RSI",
-                        "symbol": ticker,
-                        "interval": "daily",
-                        "time_period": period,
-                        "series_type": "close",
-                        "apikey": self.api_key
-                    },
-                    timeout=10.0
-                )
-                data = response.json()
-
-                # Get most recent RSI value
-                technical_data = data.get("Technical Analysis: RSI", {})
-                if technical_data:
-                    latest_date = list(technical_data.keys())[0]
-                    rsi_value = float(technical_data[latest_date].get("RSI", 50))
-                    return {"rsi": round(rsi_value, 2)}
-
-                return {"rsi": 50}  # Default neutral
+            data = await self._get_json(
+                {
+                    "function": "RSI",
+                    "symbol": ticker,
+                    "interval": "daily",
+                    "time_period": period,
+                    "series_type": "close",
+                    "apikey": self.api_key
+                }
+            )
+
+            # Get most recent RSI value
+            technical_data = data.get("Technical Analysis: RSI", {})
+            if technical_data:
+                latest_date = next(iter(technical_data))
+                rsi_value = float(technical_data[latest_date].get("RSI", 50))
+                return {"rsi": round(rsi_value, 2)}
+
+            return {"rsi": 50}  # Default neutral
 
         except Exception as e:
             return {"rsi": 50, "error": str(e)}
 
+    @dedupe
     async def _get_sma(self, ticker: str, period: int) -> Dict:
         """Get Simple Moving Average"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    self.BASE_URL,
-                    params={
-                        "function": "SMA",
-                        "symbol": ticker,
-                        "interval": "daily",
-                        "time_period": period,
-                        "series_type": "close",
-                        "apikey": self.api_key
-                    },
-                    timeout=10.0
-                )
-                data = response.json()
-
-                technical_data = data.get(f"Technical Analysis: SMA", {})
-                if technical_data:
-                    latest_date = list(technical_data.keys())[0]
-                    sma_value = float(technical_data[latest_date].get("SMA", 0))
-                    return {"sma": round(sma_value, 2)}
-
-                return {"sma": None}
+            data = await self._get_json(
+                {
+                    "function": "SMA",
+                    "symbol": ticker,
+                    "interval": "daily",
+                    "time_period": period,
+                    "series_type": "close",
+                    "apikey": self.api_key
+                }
+            )
+
+            technical_data = data.get(f"Technical Analysis: SMA", {})
+            if technical_data:
+                latest_date = next(iter(technical_data))
+                sma_value = float(technical_data[latest_date].get("SMA", 0))
+                return {"sma": round(sma_value, 2)}
+
+            return {"sma": None}
 
         except Exception as e:
             return {"sma": None, "error": str(e)}
@@ -128,59 +225,53 @@ class AlphaVantageSource:
         """Interpret RSI value"""
         if rsi is None:
             return "Unknown"
-        if rsi >= 70:
-            return "Overbought"
-        elif rsi <= 30:
-            return "Oversold"
-        elif rsi >= 60:
-            return "Bullish"
-        elif rsi <= 40:
-            return "Bearish"
-        return "Neutral"
+        return _RSI_LABELS[bisect_left(_RSI_LOWER, rsi) + bisect_right(_RSI_UPPER, rsi)]
 
     def _interpret_trend(self, sma_20: Optional[float], sma_50: Optional[float]) -> str:
         """Interpret trend based on moving averages"""
         if sma_20 is None or sma_50 is None:
             return "Unknown"
-        if sma_20 > sma_50:
-            return "Uptrend"
-        elif sma_20 < sma_50:
-            return "Downtrend"
-        return "Sideways"
+        return _TREND_LABELS[(sma_20 > sma_50) + 2 * (sma_20 < sma_50)]
 
+    @ttl_cache(OVERVIEW_TTL)
+    @dedupe
     async def get_overview(self, ticker: str) -> Dict:
         """Get company overview/fundamentals"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    self.BASE_URL,
-                    params={
-                        "function": "OVERVIEW",
-                        "symbol": ticker,
-                        "apikey": self.api_key
-                    },
-                    timeout=10.0
-                )
-                data = response.json()
-
-                return {
-                    "ticker": ticker,
-                    "name": data.get("Name"),
-                    "description": data.get("Description", "")[:500],
-                    "sector": data.get("Sector"),
-                    "industry": data.get("Industry"),
-                    "market_cap": data.get("MarketCapitalization"),
-                    "pe_ratio": data.get("PERatio"),
-                    "peg_ratio": data.get("PEGRatio"),
-                    "book_value": data.get("BookValue"),
-                    "dividend_yield": data.get("DividendYield"),
-                    "eps": data.get("EPS"),
-                    "revenue_ttm": data.get("RevenueTTM"),
-                    "profit_margin": data.get("ProfitMargin"),
-                    "52_week_high": data.get("52WeekHigh"),
-                    "52_week_low": data.get("52WeekLow"),
-                    "analyst_target": data.get("AnalystTargetPrice")
+            data = await self._get_json(
+                {
+                    "function": "OVERVIEW",
+                    "symbol": ticker,
+                    "apikey": self.api_key
                 }
+            )
+
+            overview = {
+                "ticker": ticker,
+                "name": data.get("Name"),
+                "description": data.get("Description", "")[:500],
+                "sector": data.get("Sector"),
+                "industry": data.get("Industry"),
+            }
+            # Alpha Vantage sends numbers as strings ("None"/"-" when missing)
+            overview.update(
+                (key, _to_float(data.get(field))) for key, field in _NUMERIC_OVERVIEW_FIELDS
+            )
+            return overview
 
         except Exception as e:
             return {"ticker": ticker, "error": str(e)}
+
+    async def get_all(self, ticker: str) -> Dict:
+        """Get quote, technicals and overview concurrently"""
+        quote, technicals, overview = await asyncio.gather(
+            self.get_quote(ticker),
+            self.get_technicals(ticker),
+            self.get_overview(ticker),
+            return_exceptions=True
+        )
+        results = {"quote": quote, "technicals": technicals, "overview": overview}
+        return {
+            key: {"ticker": ticker, "error": str(value)} if isinstance(value, Exception) else value
+            for key, value in results.items()
+        }
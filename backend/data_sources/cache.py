@@ -0,0 +1,72 @@
+"""
+Stockman - Request Caching Helpers
+Shared decorators for data source coroutines
+"""
+
+import time
+import asyncio
+import functools
+from collections import OrderedDict
+
+
+def cacheable(value) -> bool:
+    """
+    Whether a source result is worth caching. Error results ({"error": ...})
+    and empty lists (a failed or throttled fetch) are retried instead.
+    """
+    if isinstance(value, dict):
+        return "error" not in value
+    if isinstance(value, list):
+        return bool(value)
+    return True
+
+
+def dedupe(func):
+    """
+    Share one in-flight call between concurrent identical requests.
+    Calls are keyed by method name and arguments, per source instance.
+    """
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        inflight = self.__dict__.setdefault("_inflight", {})
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+
+        future = inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func(self, *args, **kwargs))
+            inflight[key] = future
+            future.add_done_callback(lambda _: inflight.pop(key, None))
+
+        # Shield so one caller timing out doesn't cancel the call for the rest
+        return await asyncio.shield(future)
+
+    return wrapper
+
+
+def ttl_cache(seconds: float, maxsize: int = 512):
+    """
+    Cache a source coroutine's result per instance for `seconds`.
+    Results that fail `cacheable` are not cached. Least recently used
+    entries are evicted past `maxsize`.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            cache = self.__dict__.setdefault("_ttl_cache", OrderedDict())
+            key = (func.__name__, args, tuple(sorted(kwargs.items())))
+
+            entry = cache.get(key)
+            if entry and time.monotonic() - entry[0] < seconds:
+                cache.move_to_end(key)
+                return entry[1]
+
+            value = await func(self, *args, **kwargs)
+            if cacheable(value):
+                cache[key] = (time.monotonic(), value)
+                cache.move_to_end(key)
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return value
+
+        return wrapper
+    return decorator
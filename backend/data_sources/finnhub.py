@@ -3,9 +3,24 @@ Stockman - Finnhub Data Source
 News, sentiment, and analyst ratings
 """
 
+import asyncio
 import httpx
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+import orjson
+from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from .cache import dedupe, ttl_cache
+from .ratelimit import TokenBucket
+
+# Cache lifetime in seconds
+QUOTE_TTL = 15
+
+
+@lru_cache(maxsize=8)
+def _date_range(days: int, today: int) -> Tuple[str, str]:
+    """(from, to) date strings covering `days` up to the given ordinal day"""
+    end = date.fromordinal(today)
+    return (end - timedelta(days=days)).isoformat(), end.isoformat()
 
 
 class FinnhubSource:
@@ -15,166 +30,204 @@ class FinnhubSource:
 
     def __init__(self, api_key: str):
         self.api_key = api_key
-
+        # One pooled HTTP/2 client so concurrent calls multiplex on a
+        # kept-alive connection, with compressed JSON responses
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=10.0,
+            headers={"Accept-Encoding": "gzip, br"},
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        # Finnhub allows 30 requests per second
+        self._semaphore = asyncio.Semaphore(30)
+        self._bucket = TokenBucket(rate=30, capacity=30)
+
+    async def aclose(self):
+        """Close the pooled HTTP client"""
+        await self._client.aclose()
+
+    async def warmup(self):
+        """Open a connection ahead of the first request so it skips the TLS handshake"""
+        try:
+            await self._client.head(self.BASE_URL)
+        except httpx.HTTPError:
+            pass
+
+    async def _get(self, url: str, params: Dict) -> httpx.Response:
+        """GET within the provider's concurrency and rate limits"""
+        async with self._semaphore:
+            await self._bucket.take()
+            return await self._client.get(url, params=params)
+
+    async def _get_json(self, url: str, params: Dict):
+        """GET and parse a response, raising on HTTP errors and error payloads"""
+        response = await self._get(url, params)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        if isinstance(data, dict) and "error" in data:
+            raise ValueError(data["error"])
+        return data
+
+    @ttl_cache(QUOTE_TTL)
+    @dedupe
     async def get_quote(self, ticker: str) -> Dict:
         """Get current quote from Finnhub"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.BASE_URL}/quote",
-                    params={"symbol": ticker, "token": self.api_key},
-                    timeout=10.0
-                )
-                data = response.json()
-
-                return {
-                    "ticker": ticker,
-                    "current": data.get("c", 0),
-                    "change": data.get("d", 0),
-                    "change_pct": data.get("dp", 0),
-                    "high": data.get("h", 0),
-                    "low": data.get("l", 0),
-                    "open": data.get("o", 0),
-                    "previous_close": data.get("pc", 0)
-                }
+            data = await self._get_json(
+                f"{self.BASE_URL}/quote",
+                params={"symbol": ticker, "token": self.api_key}
+            )
+
+            return {
+                "ticker": ticker,
+                "current": data.get("c", 0),
+                "change": data.get("d", 0),
+                "change_pct": data.get("dp", 0),
+                "high": data.get("h", 0),
+                "low": data.get("l", 0),
+                "open": data.get("o", 0),
+                "previous_close": data.get("pc", 0)
+            }
         except Exception as e:
             return {"error": str(e), "ticker": ticker}
 
+    @dedupe
     async def get_news(self, ticker: str, days: int = 7) -> List[Dict]:
         """Get recent news for a ticker"""
         try:
-            from_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
-            to_date = datetime.now().strftime("%Y-%m-%d")
-
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.BASE_URL}/company-news",
-                    params={
-                        "symbol": ticker,
-                        "from": from_date,
-                        "to": to_date,
-                        "token": self.api_key
-                    },
-                    timeout=10.0
-                )
-                news = response.json()
-
-                if not isinstance(news, list):
-                    return []
-
-                return [{
-                    "headline": item.get("headline", ""),
-                    "summary": item.get("summary", "")[:200],
-                    "source": item.get("source", ""),
-                    "url": item.get("url", ""),
-                    "datetime": datetime.fromtimestamp(
-                        item.get("datetime", 0)
-                    ).isoformat() if item.get("datetime") else None
-                } for item in news[:10]]  # Top 10 articles
+            from_date, to_date = _date_range(days, date.today().toordinal())
+
+            news = await self._get_json(
+                f"{self.BASE_URL}/company-news",
+                params={
+                    "symbol": ticker,
+                    "from": from_date,
+                    "to": to_date,
+                    "token": self.api_key
+                }
+            )
+
+            if not isinstance(news, list):
+                return []
+
+            return [{
+                "headline": item.get("headline", ""),
+                "summary": item.get("summary", "")[:200],
+                "source": item.get("source", ""),
+                "url": item.get("url", ""),
+                "datetime": datetime.fromtimestamp(
+                    item.get("datetime", 0)
+                ).isoformat() if item.get("datetime") else None
+            } for item in news[:10]]  # Top 10 articles
 
         except Exception as e:
             return []
 
+    @dedupe
     async def get_sentiment(self, ticker: str) -> Dict:
         """Get social sentiment for a ticker"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.BASE_URL}/stock/social-sentiment",
-                    params={"symbol": ticker, "token": self.api_key},
-                    timeout=10.0
-                )
-                data = response.json()
-
-                # Aggregate sentiment
-                reddit = data.get("reddit", [])
-                twitter = data.get("twitter", [])
-
-                total_mentions = 0
-                positive = 0
-                negative = 0
-
-                for item in reddit + twitter:
-                    total_mentions += item.get("mention", 0)
-                    positive += item.get("positiveScore", 0)
-                    negative += item.get("negativeScore", 0)
-
-                sentiment_score = 0.5  # Neutral default
-                if positive + negative > 0:
-                    sentiment_score = positive / (positive + negative)
-
-                return {
-                    "ticker": ticker,
-                    "sentiment_score": round(sentiment_score, 2),
-                    "total_mentions": total_mentions,
-                    "positive": positive,
-                    "negative": negative
-                }
+            data = await self._get_json(
+                f"{self.BASE_URL}/stock/social-sentiment",
+                params={"symbol": ticker, "token": self.api_key}
+            )
+
+            # Aggregate sentiment
+            reddit = data.get("reddit", [])
+            twitter = data.get("twitter", [])
+
+            items = (reddit, twitter)
+            total_mentions = sum(i.get("mention", 0) for feed in items for i in feed)
+            positive = sum(i.get("positiveScore", 0) for feed in items for i in feed)
+            negative = sum(i.get("negativeScore", 0) for feed in items for i in feed)
+
+            sentiment_score = 0.5  # Neutral default
+            if positive + negative > 0:
+                sentiment_score = positive / (positive + negative)
+
+            return {
+                "ticker": ticker,
+                "sentiment_score": round(sentiment_score, 2),
+                "total_mentions": total_mentions,
+                "positive": positive,
+                "negative": negative
+            }
 
         except Exception as e:
             return {"ticker": ticker, "sentiment_score": 0.5, "error": str(e)}
 
+    @dedupe
     async def get_analyst_ratings(self, ticker: str) -> Dict:
         """Get analyst recommendations"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.BASE_URL}/stock/recommendation",
-                    params={"symbol": ticker, "token": self.api_key},
-                    timeout=10.0
-                )
-                data = response.json()
-
-                if not data:
-                    return {"ticker": ticker, "analyst_rating": None}
-
-                # Get most recent recommendation
-                latest = data[0] if isinstance(data, list) and data else {}
-
-                buy = latest.get("buy", 0) + latest.get("strongBuy", 0)
-                hold = latest.get("hold", 0)
-                sell = latest.get("sell", 0) + latest.get("strongSell", 0)
-                total = buy + hold + sell
-
-                rating = "Hold"
-                if total > 0:
-                    if buy / total > 0.6:
-                        rating = "Strong Buy"
-                    elif buy / total > 0.4:
-                        rating = "Buy"
-                    elif sell / total > 0.4:
-                        rating = "Sell"
-
-                return {
-                    "ticker": ticker,
-                    "analyst_rating": rating,
-                    "buy_count": buy,
-                    "hold_count": hold,
-                    "sell_count": sell,
-                    "period": latest.get("period")
-                }
+            data = await self._get_json(
+                f"{self.BASE_URL}/stock/recommendation",
+                params={"symbol": ticker, "token": self.api_key}
+            )
+
+            if not data:
+                return {"ticker": ticker, "analyst_rating": None}
+
+            # Get most recent recommendation
+            latest = data[0] if isinstance(data, list) and data else {}
+
+            buy = latest.get("buy", 0) + latest.get("strongBuy", 0)
+            hold = latest.get("hold", 0)
+            sell = latest.get("sell", 0) + latest.get("strongSell", 0)
+            total = buy + hold + sell
+
+            rating = "Hold"
+            if total > 0:
+                if buy / total > 0.6:
+                    rating = "Strong Buy"
+                elif buy / total > 0.4:
+                    rating = "Buy"
+                elif sell / total > 0.4:
+                    rating = "Sell"
+
+            return {
+                "ticker": ticker,
+                "analyst_rating": rating,
+                "buy_count": buy,
+                "hold_count": hold,
+                "sell_count": sell,
+                "period": latest.get("period")
+            }
 
         except Exception as e:
             return {"ticker": ticker, "analyst_rating": None, "error": str(e)}
 
+    @dedupe
     async def get_price_target(self, ticker: str) -> Dict:
         """Get analyst price targets"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.BASE_URL}/stock/price-target",
-                    params={"symbol": ticker, "token": self.api_key},
-                    timeout=10.0
-                )
-                data = response.json()
-
-                return {
-                    "ticker": ticker,
-                    "target_high": data.get("targetHigh"),
-                    "target_low": data.get("targetLow"),
-                    "target_mean": data.get("targetMean"),
-                    "target_median": data.get("targetMedian")
-                }
+            data = await self._get_json(
+                f"{self.BASE_URL}/stock/price-target",
+                params={"symbol": ticker, "token": self.api_key}
+            )
+
+            return {
+                "ticker": ticker,
+                "target_high": data.get("targetHigh"),
+                "target_low": data.get("targetLow"),
+                "target_mean": data.get("targetMean"),
+                "target_median": data.get("targetMedian")
+            }
 
         except Exception as e:
             return {"ticker": ticker, "error": str(e)}
+
+    async def get_all(self, ticker: str) -> Dict:
+        """Get quote, sentiment, ratings and price target concurrently"""
+        quote, sentiment, ratings, target = await asyncio.gather(
+            self.get_quote(ticker),
+            self.get_sentiment(ticker),
+            self.get_analyst_ratings(ticker),
+            self.get_price_target(ticker),
+            return_exceptions=True
+        )
+        results = {"quote": quote, "sentiment": sentiment, "ratings": ratings, "target": target}
+        return {
+            key: {"ticker": ticker, "error": str(value)} if isinstance(value, Exception) else value
+            for key, value in results.items()
+        }
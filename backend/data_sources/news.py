@@ -7,12 +7,54 @@ import feedparser
 import httpx
 from typing import List, Dict
 from datetime import datetime
+from urllib.parse import quote_plus
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
 
 
 class NewsSource:
     """Aggregates news from multiple free sources"""
 
+    GOOGLE_NEWS_URL = "https://news.google.com/rss/search?q={query}&hl=en-US&gl=US&ceid=US:en"
+    YAHOO_RSS_URL = "https://feeds.finance.yahoo.com/rss/2.0/headline?s={ticker}&region=US&lang=en-US"
+    MARKET_NEWS_URL = GOOGLE_NEWS_URL.format(query="stock+market")
+
+    FEED_TIMEOUT = 5.0
+    MAX_FEED_BYTES = 512_000  # Only the first few items are used anyway
+
+    def __init__(self):
+        # Feeds are fetched over a pooled async client; only the XML parse
+        # runs in threads, on a small pool of its own
+        self._client = httpx.AsyncClient(timeout=10.0, follow_redirects=True)
+        self._parse_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="feedparse")
+
+    async def aclose(self):
+        """Close the pooled HTTP client and parse pool"""
+        await self._client.aclose()
+        self._parse_pool.shutdown(wait=False)
+
+    async def warmup(self):
+        """Open a connection ahead of the first request so it skips the TLS handshake"""
+        try:
+            await self._client.head("https://news.google.com/")
+        except httpx.HTTPError:
+            pass
+
+    async def _fetch_feed(self, url: str):
+        """Fetch an RSS feed (capped at MAX_FEED_BYTES) and parse it off the event loop"""
+        content = bytearray()
+        async with self._client.stream("GET", url, timeout=self.FEED_TIMEOUT) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                content += chunk
+                if len(content) >= self.MAX_FEED_BYTES:
+                    break
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self._parse_pool, feedparser.parse, bytes(content[:self.MAX_FEED_BYTES])
+        )
+
     async def get_news(self, ticker: str, limit: int = 10) -> List[Dict]:
         """Get news for a ticker from multiple sources"""
         try:
@@ -40,12 +82,8 @@ class NewsSource:
     async def _get_google_news(self, ticker: str) -> List[Dict]:
         """Get news from Google News RSS"""
         try:
-            # Run feedparser in executor (it's synchronous)
-            loop = asyncio.get_event_loop()
-            feed = await loop.run_in_executor(
-                None,
-                feedparser.parse,
-                f"https://news.google.com/rss/search?q={ticker}+stock&hl=en-US&gl=US&ceid=US:en"
+            feed = await self._fetch_feed(
+                self.GOOGLE_NEWS_URL.format(query=quote_plus(f"{ticker} stock"))
             )
 
             news = []
@@ -66,11 +104,8 @@ class NewsSource:
     async def _get_yahoo_rss(self, ticker: str) -> List[Dict]:
         """Get news from Yahoo Finance RSS"""
         try:
-            loop = asyncio.get_event_loop()
-            feed = await loop.run_in_executor(
-                None,
-                feedparser.parse,
-                f"https://feeds.finance.yahoo.com/rss/2.0/headline?s={ticker}&region=US&lang=en-US"
+            feed = await self._fetch_feed(
+                self.YAHOO_RSS_URL.format(ticker=quote_plus(ticker))
             )
 
             news = []
@@ -91,12 +126,7 @@ class NewsSource:
     async def get_market_news(self, limit: int = 10) -> List[Dict]:
         """Get general market news"""
         try:
-            loop = asyncio.get_event_loop()
-            feed = await loop.run_in_executor(
-                None,
-                feedparser.parse,
-                "https://news.google.com/rss/search?q=stock+market&hl=en-US&gl=US&ceid=US:en"
-            )
+            feed = await self._fetch_feed(self.MARKET_NEWS_URL)
 
             news = []
             for entry in feed.entries[:limit]:
@@ -0,0 +1,30 @@
+"""
+Stockman - Rate Limiting
+Keeps per-provider request rates under the API limits
+"""
+
+import time
+import asyncio
+
+
+class TokenBucket:
+    """Async token bucket - `rate` requests per second, bursting up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def take(self):
+        """Wait until a token is available and consume it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
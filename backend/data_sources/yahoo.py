@@ -3,75 +3,243 @@ Stockman - Yahoo Finance Data Source
 Free, reliable source for price and fundamental data
 """
 
+import time
+import threading
+import httpx
+import orjson
 import yfinance as yf
-from typing import Dict, Optional
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
 import asyncio
+from .cache import dedupe, ttl_cache
+
+# Cache lifetimes in seconds
+QUOTE_TTL = 15
+FINANCIALS_TTL = 24 * 60 * 60
 
 
 class YahooFinanceSource:
     """Yahoo Finance data source"""
 
+    QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+    BULK_CHUNK = 20  # Max symbols per quote request
+    BULK_RETRY_AFTER = 10 * 60  # Seconds to skip the bulk endpoint after it fails
+    TICKER_CACHE_SIZE = 256  # Most yf.Ticker objects kept for reuse
+
+    def __init__(self):
+        self._client = httpx.AsyncClient(
+            timeout=10.0,
+            headers={"User-Agent": "Mozilla/5.0"}
+        )
+        self._bulk_retry_at = 0.0
+        # (created at, yf.Ticker) in creation order; _fetch_quote runs in
+        # executor threads, hence the lock
+        self._tickers: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tickers_lock = threading.Lock()
+
+    async def aclose(self):
+        """Close the pooled HTTP client"""
+        await self._client.aclose()
+
+    async def warmup(self):
+        """Open a connection ahead of the first request so it skips the TLS handshake"""
+        try:
+            await self._client.head(self.QUOTE_URL)
+        except httpx.HTTPError:
+            pass
+
+    @ttl_cache(QUOTE_TTL)
+    @dedupe
     async def get_quote(self, ticker: str) -> Dict:
         """Get current quote and basic info for a ticker"""
         try:
-            # Run in executor since yfinance is synchronous
+            quotes = await self.get_quotes_bulk([ticker])
+            return quotes[ticker]
+        except Exception as e:
+            return {"error": str(e), "ticker": ticker}
+
+    async def get_quotes_bulk(self, tickers: List[str],
+                              on_quote: Optional[Callable[[str, Dict], None]] = None) -> Dict[str, Dict]:
+        """
+        Get quotes for many tickers, up to BULK_CHUNK symbols per request.
+        Tickers the bulk endpoint doesn't return fall back to the
+        per-ticker yfinance cascade in _fetch_quote. Each chunk runs on its
+        own, and on_quote(ticker, quote) is called as each quote is ready.
+        """
+        results = {}
+        chunks = [tickers[i:i + self.BULK_CHUNK]
+                  for i in range(0, len(tickers), self.BULK_CHUNK)]
+        await asyncio.gather(*(self._quote_chunk(chunk, results, on_quote) for chunk in chunks))
+        return results
+
+    async def _quote_chunk(self, tickers: List[str], results: Dict[str, Dict],
+                           on_quote: Optional[Callable[[str, Dict], None]]):
+        """One bulk request, then the yfinance fallback for whatever it missed"""
+        def done(ticker: str, quote: Dict):
+            results[ticker] = quote
+            if on_quote:
+                on_quote(ticker, quote)
+
+        if time.monotonic() >= self._bulk_retry_at:
+            try:
+                for ticker, quote in (await self._fetch_quote_chunk(tickers)).items():
+                    done(ticker, quote)
+            except Exception:
+                # Usually Yahoo refusing unauthenticated bulk requests - back off
+                self._bulk_retry_at = time.monotonic() + self.BULK_RETRY_AFTER
+
+        # Run in executor since yfinance is synchronous
+        loop = asyncio.get_event_loop()
+
+        async def fallback(ticker: str):
+            try:
+                quote = await loop.run_in_executor(None, self._fetch_quote, ticker)
+            except Exception as e:
+                quote = {"error": str(e), "ticker": ticker}
+            done(ticker, quote)
+
+        await asyncio.gather(*(fallback(t) for t in tickers if t not in results))
+
+    async def _fetch_quote_chunk(self, tickers: List[str]) -> Dict[str, Dict]:
+        """Fetch one multi-symbol quote request"""
+        response = await self._client.get(
+            self.QUOTE_URL, params={"symbols": ",".join(tickers)}
+        )
+        response.raise_for_status()
+        rows = orjson.loads(response.content).get("quoteResponse", {}).get("result") or []
+
+        wanted = set(tickers)
+        return {
+            row["symbol"]: self._parse_quote(row)
+            for row in rows
+            if row.get("symbol") in wanted and row.get("regularMarketPrice")
+        }
+
+    def _parse_quote(self, row: Dict) -> Dict:
+        """Convert a v7 quote row to the _fetch_quote shape"""
+        current_price = row.get("regularMarketPrice") or 0
+        previous_close = row.get("regularMarketPreviousClose") or current_price
+        change = current_price - previous_close if previous_close else 0
+        change_pct = (change / previous_close * 100) if previous_close else 0
+
+        return {
+            "ticker": row["symbol"],
+            "name": row.get("shortName") or row.get("longName") or row["symbol"],
+            "price": round(current_price, 2),
+            "previous_close": round(previous_close, 2) if previous_close else 0,
+            "change": round(change, 2),
+            "change_pct": round(change_pct, 2),
+            "volume": row.get("regularMarketVolume") or 0,
+            "avg_volume": row.get("averageDailyVolume3Month", 0),
+            "market_cap": row.get("marketCap", 0),
+            "pe_ratio": row.get("trailingPE"),
+            "forward_pe": row.get("forwardPE"),
+            "eps": row.get("epsTrailingTwelveMonths"),
+            "dividend_yield": row.get("dividendYield"),
+            "high_52w": row.get("fiftyTwoWeekHigh"),
+            "low_52w": row.get("fiftyTwoWeekLow"),
+            "high_today": row.get("regularMarketDayHigh"),
+            "low_today": row.get("regularMarketDayLow"),
+            "open": row.get("regularMarketOpen"),
+            # Not part of the quote endpoint
+            "sector": None,
+            "industry": None,
+            "description": ""
+        }
+
+    @ttl_cache(QUOTE_TTL)
+    @dedupe
+    async def get_quote_fast(self, ticker: str) -> Dict:
+        """Get price/volume quote only, skipping the slow info scrape"""
+        try:
             loop = asyncio.get_event_loop()
-            data = await loop.run_in_executor(None, self._fetch_quote, ticker)
-            return data
+            return await loop.run_in_executor(None, self._fetch_quote, ticker, False)
         except Exception as e:
             return {"error": str(e), "ticker": ticker}
 
-    def _fetch_quote(self, ticker: str) -> Dict:
-        """Synchronous fetch for Yahoo Finance"""
-        stock = yf.Ticker(ticker)
+    def _ticker(self, ticker: str) -> yf.Ticker:
+        """Reuse a yf.Ticker briefly; it memoizes its data forever, so expire it"""
+        now = time.monotonic()
+        with self._tickers_lock:
+            entry = self._tickers.get(ticker)
+            if entry and now - entry[0] < QUOTE_TTL:
+                return entry[1]
+            stock = yf.Ticker(ticker)
+            self._tickers.pop(ticker, None)
+            self._tickers[ticker] = (now, stock)
+            # Oldest first: drop expired entries and anything past the size
+            # cap, so one-off symbols don't hold their Ticker (and its
+            # history and info) for the life of the process
+            while (len(self._tickers) > self.TICKER_CACHE_SIZE
+                   or now - next(iter(self._tickers.values()))[0] >= QUOTE_TTL):
+                self._tickers.popitem(last=False)
+        return stock
+
+    def _fetch_quote(self, ticker: str, full: bool = True) -> Dict:
+        """
+        Synchronous fetch for Yahoo Finance.
+        full=False stops after fast_info/history and leaves fundamentals empty.
+        """
+        stock = self._ticker(ticker)
 
         current_price = 0
         previous_close = 0
         volume = 0
         name = ticker
+        fast_fields = {}
 
-        # Method 1: Try history first (most reliable for getting price)
-        try:
-            hist = stock.history(period="5d")
-            if not hist.empty:
-                current_price = float(hist['Close'].iloc[-1])
-                if len(hist) > 1:
-                    previous_close = float(hist['Close'].iloc[-2])
-                else:
-                    previous_close = current_price
-                volume = int(hist['Volume'].iloc[-1]) if 'Volume' in hist.columns else 0
-        except Exception:
-            pass
-
-        # Method 2: Try fast_info (faster than info)
+        # Method 1: Try fast_info (price, volume and a few fundamentals)
         try:
             fast = stock.fast_info
-            if current_price == 0:
-                current_price = getattr(fast, 'last_price', 0) or 0
-            if previous_close == 0:
-                previous_close = getattr(fast, 'previous_close', 0) or current_price
-            if volume == 0:
-                volume = getattr(fast, 'last_volume', 0) or 0
+            current_price = getattr(fast, 'last_price', 0) or 0
+            previous_close = getattr(fast, 'previous_close', 0) or 0
+            volume = getattr(fast, 'last_volume', 0) or 0
+            # All derived from the same price history fast_info already loaded
+            fast_fields = {
+                "averageVolume": getattr(fast, 'three_month_average_volume', 0),
+                "fiftyTwoWeekHigh": getattr(fast, 'year_high', None),
+                "fiftyTwoWeekLow": getattr(fast, 'year_low', None),
+                "dayHigh": getattr(fast, 'day_high', None),
+                "dayLow": getattr(fast, 'day_low', None),
+                "open": getattr(fast, 'open', None),
+            }
         except Exception:
             pass
 
-        # Method 3: Try info dict (slowest but has most data)
+        # Method 2: Fall back to recent history
+        if current_price == 0:
+            try:
+                hist = stock.history(period="5d")
+                if not hist.empty:
+                    current_price = float(hist['Close'].iloc[-1])
+                    if len(hist) > 1:
+                        previous_close = float(hist['Close'].iloc[-2])
+                    else:
+                        previous_close = current_price
+                    volume = int(hist['Volume'].iloc[-1]) if 'Volume' in hist.columns else 0
+            except Exception:
+                pass
+
+        # Method 3: Try info dict (slowest but has most data) - only when
+        # fundamentals were asked for or nothing else produced a price
         info = {}
-        try:
-            info = stock.info or {}
-            if current_price == 0:
-                current_price = (
-                    info.get("currentPrice") or
-                    info.get("regularMarketPrice") or
-                    info.get("regularMarketPreviousClose") or
-                    info.get("previousClose") or
-                    0
-                )
-            if previous_close == 0:
-                previous_close = info.get("previousClose") or info.get("regularMarketPreviousClose") or current_price
-            name = info.get("shortName", ticker)
-        except Exception:
-            pass
+        if full or current_price == 0:
+            try:
+                info = stock.info or {}
+                if current_price == 0:
+                    current_price = (
+                        info.get("currentPrice") or
+                        info.get("regularMarketPrice") or
+                        info.get("regularMarketPreviousClose") or
+                        info.get("previousClose") or
+                        0
+                    )
+                if previous_close == 0:
+                    previous_close = info.get("previousClose") or info.get("regularMarketPreviousClose") or current_price
+                name = info.get("shortName", ticker)
+            except Exception:
+                pass
+        info = {**fast_fields, **{k: v for k, v in info.items() if v is not None}}
 
         # Ensure we have a previous_close for change calculation
         if previous_close == 0:
@@ -117,23 +285,25 @@ class YahooFinanceSource:
 
     def _fetch_history(self, ticker: str, period: str) -> Dict:
         """Synchronous fetch for historical data"""
-        stock = yf.Ticker(ticker)
+        stock = self._ticker(ticker)
         hist = stock.history(period=period)
 
         if hist.empty:
             return {"ticker": ticker, "history": []}
 
-        # Convert to list of dicts
-        history = []
-        for date, row in hist.iterrows():
-            history.append({
-                "date": date.strftime("%Y-%m-%d"),
-                "open": round(row["Open"], 2),
-                "high": round(row["High"], 2),
-                "low": round(row["Low"], 2),
-                "close": round(row["Close"], 2),
-                "volume": int(row["Volume"])
-            })
+        # Convert to list of dicts, column-wise rather than row by row
+        prices = hist[["Open", "High", "Low", "Close"]].round(2)
+        history = [
+            {"date": d, "open": o, "high": h, "low": l, "close": c, "volume": v}
+            for d, o, h, l, c, v in zip(
+                hist.index.strftime("%Y-%m-%d").tolist(),
+                prices["Open"].tolist(),
+                prices["High"].tolist(),
+                prices["Low"].tolist(),
+                prices["Close"].tolist(),
+                hist["Volume"].astype("int64").tolist()
+            )
+        ]
 
         return {
             "ticker": ticker,
@@ -141,6 +311,7 @@ class YahooFinanceSource:
             "history": history
         }
 
+    @ttl_cache(FINANCIALS_TTL)
     async def get_financials(self, ticker: str) -> Dict:
         """Get financial statements"""
         try:
@@ -152,7 +323,7 @@ class YahooFinanceSource:
 
     def _fetch_financials(self, ticker: str) -> Dict:
         """Synchronous fetch for financials"""
-        stock = yf.Ticker(ticker)
+        stock = self._ticker(ticker)
 
         # Get income statement
         income = stock.income_stmt
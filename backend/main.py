@@ -5,14 +5,24 @@ Main FastAPI Application
 
 import os
 import sys
-from datetime import datetime
+import time
+import heapq
+import asyncio
+import httpx
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from operator import itemgetter
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List
-import json
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import AfterValidator, BaseModel
+from typing import Annotated, Awaitable, Callable, Dict, Optional, List
+import orjson
+from anthropic import AsyncAnthropic
+from openai import AsyncOpenAI
+from elevenlabs.client import AsyncElevenLabs
 
 # Add backend directory to path for Vercel compatibility
 backend_dir = os.path.dirname(os.path.abspath(__file__))
@@ -21,13 +31,15 @@ if backend_dir not in sys.path:
 
 from memory import MemoryManager
 from data_sources.aggregator import DataAggregator
+from data_sources.cache import cacheable
 from briefing import BriefingGenerator
 
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
 
-app = FastAPI(title="Stockman", version="1.0.0")
+# orjson serializes the dict-heavy market and portfolio payloads much faster
+app = FastAPI(title="Stockman", version="1.0.0", default_response_class=ORJSONResponse)
 
 # CORS for frontend
 app.add_middleware(
@@ -38,19 +50,133 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress the larger JSON payloads (briefing, market overview, portfolio).
+# Streams opt out with Content-Encoding: identity - see NO_COMPRESSION
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=1)
+NO_COMPRESSION = {"Content-Encoding": "identity"}
+
 # Initialize components
 memory = MemoryManager()
 data_aggregator = DataAggregator()
 briefing_generator = BriefingGenerator()
 
+# API clients are built once (on first use, so a missing key only fails
+# the endpoint that needs it) and reused so their connections stay pooled
+
+# One HTTP/2 pool shared by the Anthropic and OpenAI SDKs, so bursts of chat
+# and transcription reuse warm TLS connections
+llm_http_client = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(60.0, connect=5.0),
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+)
+
+@lru_cache(maxsize=None)
+def get_anthropic_client() -> AsyncAnthropic:
+    return AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), http_client=llm_http_client)
+
+@lru_cache(maxsize=None)
+def get_openai_client() -> AsyncOpenAI:
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=llm_http_client)
+
+@lru_cache(maxsize=None)
+def get_elevenlabs_client() -> AsyncElevenLabs:
+    return AsyncElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
+
+# Caps on concurrent calls per provider so bursts queue here instead of
+# tripping upstream rate limits; tune to the plan tier via env
+anthropic_limit = asyncio.Semaphore(int(os.getenv("ANTHROPIC_MAX_PARALLEL", "8")))
+openai_limit = asyncio.Semaphore(int(os.getenv("OPENAI_MAX_PARALLEL", "4")))
+finnhub_limit = asyncio.Semaphore(int(os.getenv("FINNHUB_MAX_PARALLEL", "10")))
+
+# Shared client for direct upstream calls (earnings calendar)
+http_client = httpx.AsyncClient(
+    http2=True,
+    timeout=10.0,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+)
+
+# Fire-and-forget tasks are held here so they aren't garbage collected mid-run
+_background_tasks = set()
+
+def run_in_background(func, *args):
+    """Run a blocking call on a worker thread without awaiting it"""
+    task = asyncio.create_task(asyncio.to_thread(func, *args))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+@app.on_event("startup")
+async def startup():
+    """Warm provider connections before the first user request"""
+    await data_aggregator.warmup()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Close pooled HTTP clients"""
+    await asyncio.gather(data_aggregator.aclose(), http_client.aclose(), llm_http_client.aclose())
+
+# Market endpoint results are shared by every caller for MARKET_TTL seconds
+MARKET_TTL = int(os.getenv("MARKET_TTL", "30"))
+RESULT_CACHE_SIZE = 512
+_result_cache: Dict[str, tuple] = {}
+_result_locks: Dict[str, asyncio.Lock] = {}
+cache_stats = {"hits": 0, "misses": 0}
+
+async def cached_result(key: str, ttl: float, build: Callable[[], Awaitable[dict]],
+                        complete: Callable[[dict], bool] = cacheable) -> dict:
+    """
+    Serve an endpoint result from cache, collapsing concurrent misses into
+    one build. Results that fail `complete` (errors, or every quote missing
+    after a provider timeout) are returned but not cached.
+    """
+    entry = _result_cache.get(key)
+    if entry and time.monotonic() - entry[0] < ttl:
+        cache_stats["hits"] += 1
+        return entry[1]
+
+    lock = _result_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        # Another request may have rebuilt it while we waited
+        entry = _result_cache.get(key)
+        if entry and time.monotonic() - entry[0] < ttl:
+            cache_stats["hits"] += 1
+            return entry[1]
+
+        cache_stats["misses"] += 1
+        value = await build()
+        if not complete(value):
+            return value
+        _result_cache.pop(key, None)
+        _result_cache[key] = (time.monotonic(), value)
+        # Dicts keep insertion order, so the first key is the oldest entry
+        while len(_result_cache) > RESULT_CACHE_SIZE:
+            oldest = next(iter(_result_cache))
+            del _result_cache[oldest]
+            _result_locks.pop(oldest, None)
+        return value
+
+def has_quotes(data: dict) -> bool:
+    """Whether a get_stock_data result priced at least one ticker"""
+    return any((d.get("price") or 0) > 0 for d in data.values())
+
+async def cached_stock_data(tickers: List[str]) -> dict:
+    """Stock data for a set of tickers, shared across requests for MARKET_TTL seconds"""
+    key = "stocks:" + ",".join(sorted(set(tickers)))
+    return await cached_result(
+        key, MARKET_TTL, lambda: data_aggregator.get_stock_data(tickers), has_quotes
+    )
+
 # ============== Models ==============
 
+# Tickers are normalized to upper case once, when the request is parsed
+Ticker = Annotated[str, AfterValidator(str.upper)]
+
 class ChatMessage(BaseModel):
     message: str
     is_voice: bool = False
 
 class StockAction(BaseModel):
-    ticker: str
+    ticker: Ticker
     shares: Optional[float] = None
     price: Optional[float] = None
 
@@ -60,57 +186,36 @@ class SettingsUpdate(BaseModel):
 
 # ============== API Routes ==============
 
+# Read the app shell once at startup rather than on every request
+_index_path = os.path.join(os.path.dirname(__file__), "../frontend/index.html")
+try:
+    with open(_index_path, "rb") as f:
+        INDEX_HTML = f.read()
+except FileNotFoundError:
+    INDEX_HTML = None
+
 @app.get("/")
 async def root():
     """Serve the main app - on Vercel this is handled by static routing"""
-    frontend_path = os.path.join(os.path.dirname(__file__), "../frontend/index.html")
-    if os.path.exists(frontend_path):
-        return HTMLResponse(open(frontend_path).read())
+    if INDEX_HTML is not None:
+        return HTMLResponse(INDEX_HTML)
     # On Vercel, the frontend is served via static routing
     return {"message": "Stockman API - frontend served separately"}
 
 @app.get("/api/health")
 async def health():
     """Health check"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return {"status": "healthy", "timestamp": datetime.now(), "cache": cache_stats}
 
 # ---------- Chat ----------
 
-@app.post("/api/chat")
-async def chat(msg: ChatMessage):
-    """Main chat endpoint - talk to Stockman"""
-    try:
-        # Get user context
-        context = memory.get_full_context()
-
-        # Get current market data for watchlist
-        watchlist = memory.get_watchlist()
-        portfolio = memory.get_portfolio()
-        tickers = list(set([s['ticker'] for s in watchlist] + [s['ticker'] for s in portfolio]))
-
-        market_data = {}
-        if tickers:
-            market_data = await data_aggregator.get_stock_data(tickers)
-
-        # Build prompt with context
-        from anthropic import Anthropic
-        client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-
-        user_name = context.get('profile', {}).get('name', 'Friend')
-        system_prompt = f"""You are Stockman - a personal stock research assistant who works exclusively for {user_name}. You're not a generic AI - you're THEIR dedicated assistant who knows their portfolio, preferences, and investment style.
-
-== WHO YOU'RE TALKING TO ==
-Name: {user_name}
-Their Portfolio: {json.dumps(portfolio, indent=2) if portfolio else "Not set up yet"}
-Their Watchlist: {json.dumps(watchlist, indent=2) if watchlist else "Not tracking anything yet"}
-
-== CURRENT MARKET DATA ==
-{json.dumps(market_data, indent=2) if market_data else "No stocks being tracked"}
+# Only the user's name and context vary per request; the persona and the
+# response and formatting rules are built once
+CHAT_PERSONA = """You are Stockman - a personal stock research assistant who works exclusively for {name}. You're not a generic AI - you're THEIR dedicated assistant who knows their portfolio, preferences, and investment style.
 
-== YOUR MEMORY OF PAST CONVERSATIONS ==
-{json.dumps(context.get('recent_messages', [])[-10:], indent=2)}
+"""
 
-== HOW TO RESPOND ==
+CHAT_GUIDELINES = """== HOW TO RESPOND ==
 1. Be conversational and direct - talk like a knowledgeable friend, not a formal assistant
 2. Give clear, actionable insights - not walls of text
 3. When discussing stocks, lead with the key point (up/down, opportunity, concern)
@@ -127,66 +232,189 @@ Their Watchlist: {json.dumps(watchlist, indent=2) if watchlist else "Not trackin
 - Don't use headers or excessive formatting
 - Sound human, not robotic"""
 
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1024,
-            system=system_prompt,
-            messages=[{"role": "user", "content": msg.message}]
-        )
+def save_exchange(user_message: str, assistant_reply: str):
+    """Store a chat turn, user message first so history stays in order"""
+    memory.add_messages([("user", user_message), ("assistant", assistant_reply)])
+
+CHAT_MODEL = "claude-sonnet-4-20250514"
+
+# Per-section cap on serialized context, so a large portfolio or market
+# payload can't blow up the prompt
+PROMPT_SECTION_BYTES = 8000
+
+def prompt_json(value) -> str:
+    """Compact JSON for a prompt section, truncated past PROMPT_SECTION_BYTES"""
+    data = orjson.dumps(value)
+    if len(data) <= PROMPT_SECTION_BYTES:
+        return data.decode()
+    return data[:PROMPT_SECTION_BYTES].decode(errors="ignore") + " ... (truncated)"
+
+NO_MARKET_BLOCK = """== CURRENT MARKET DATA ==
+No stocks being tracked
+
+"""
+
+# Last "who you're talking to" block as (key, built_at, block). Like the chat
+# snapshot it's built from, it's reused until the next write or SNAPSHOT_TTL,
+# so writes from other workers show up within the same bound.
+_who_block_cache = (None, 0.0, "")
+
+def build_who_block(user_name: str, write_version: int, portfolio: List, watchlist: List) -> str:
+    """Serialize the user's name and holdings, reusing a recent block if nothing changed"""
+    global _who_block_cache
+    key = (user_name, write_version)
+    cached_key, built_at, block = _who_block_cache
+    if cached_key == key and time.monotonic() - built_at < memory.SNAPSHOT_TTL:
+        return block
+
+    block = f"""== WHO YOU'RE TALKING TO ==
+Name: {user_name}
+Their Portfolio: {prompt_json(portfolio) if portfolio else "Not set up yet"}
+Their Watchlist: {prompt_json(watchlist) if watchlist else "Not tracking anything yet"}
+
+"""
+    _who_block_cache = (key, time.monotonic(), block)
+    return block
+
+async def build_system_prompt() -> str:
+    """Assemble the chat system prompt from the user's context and live quotes"""
+    # Read the version first so a concurrent write can only make the cached
+    # block newer than its key, never older
+    write_version = memory.write_version()
+    # Get user context in a single read
+    context = await asyncio.to_thread(memory.get_chat_snapshot)
+    watchlist = context['watchlist']
+    portfolio = context['portfolio']
+
+    # Get current market data for watchlist - started now, awaited last
+    tickers = list(set([s['ticker'] for s in watchlist] + [s['ticker'] for s in portfolio]))
+    market_task = None
+    if tickers:
+        market_task = asyncio.create_task(cached_stock_data(tickers))
+
+    # Build the rest of the prompt while quotes load
+    user_name = context.get('profile', {}).get('name', 'Friend')
+    who_block = build_who_block(user_name, write_version, portfolio, watchlist)
+    memory_block = f"""== YOUR MEMORY OF PAST CONVERSATIONS ==
+{prompt_json(context.get('recent_messages', [])[-10:])}
+
+"""
+
+    market_block = NO_MARKET_BLOCK
+    if market_task:
+        market_data = await market_task
+        if market_data:
+            market_block = f"""== CURRENT MARKET DATA ==
+{prompt_json(market_data)}
+
+"""
+    return "".join((
+        CHAT_PERSONA.format(name=user_name), who_block, market_block, memory_block, CHAT_GUIDELINES
+    ))
+
+@app.post("/api/chat")
+async def chat(msg: ChatMessage):
+    """Main chat endpoint - talk to Stockman"""
+    try:
+        system_prompt = await build_system_prompt()
+
+        async with anthropic_limit:
+            response = await get_anthropic_client().messages.create(
+                model=CHAT_MODEL,
+                max_tokens=1024,
+                system=system_prompt,
+                messages=[{"role": "user", "content": msg.message}]
+            )
 
         assistant_reply = response.content[0].text
 
-        # Save to memory
-        memory.add_message("user", msg.message)
-        memory.add_message("assistant", assistant_reply)
+        # Save to memory without holding up the reply
+        run_in_background(save_exchange, msg.message, assistant_reply)
 
         return {
             "reply": assistant_reply,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now()
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(payload: dict) -> bytes:
+    """Encode one server-sent event"""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream(msg: ChatMessage):
+    """Chat with Stockman, streaming the reply as server-sent events"""
+    try:
+        system_prompt = await build_system_prompt()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        parts = []
+        try:
+            async with anthropic_limit, get_anthropic_client().messages.stream(
+                model=CHAT_MODEL,
+                max_tokens=1024,
+                system=system_prompt,
+                messages=[{"role": "user", "content": msg.message}]
+            ) as stream:
+                async for text in stream.text_stream:
+                    parts.append(text)
+                    yield sse_event({"delta": text})
+        except Exception as e:
+            yield sse_event({"error": str(e)})
+            return
+
+        # Save to memory once the full reply is known
+        run_in_background(save_exchange, msg.message, "".join(parts))
+        yield sse_event({"done": True, "timestamp": datetime.now()})
+
+    # gzip would hold deltas back in its buffer, so send them uncompressed
+    return StreamingResponse(events(), media_type="text/event-stream", headers=NO_COMPRESSION)
+
 # ---------- Portfolio Management ----------
+# Handlers that only touch the database are plain `def` so FastAPI runs
+# them on its threadpool instead of blocking the event loop
 
 @app.get("/api/portfolio")
-async def get_portfolio():
+def get_portfolio():
     """Get current portfolio"""
     portfolio = memory.get_portfolio()
     return {"portfolio": portfolio}
 
 @app.post("/api/portfolio/add")
-async def add_to_portfolio(stock: StockAction):
+def add_to_portfolio(stock: StockAction):
     """Add stock to portfolio"""
-    memory.add_to_portfolio(stock.ticker.upper(), stock.shares, stock.price)
-    return {"success": True, "message": f"Added {stock.ticker.upper()} to portfolio"}
+    memory.add_to_portfolio(stock.ticker, stock.shares, stock.price)
+    return {"success": True, "message": f"Added {stock.ticker} to portfolio"}
 
 @app.delete("/api/portfolio/{ticker}")
-async def remove_from_portfolio(ticker: str):
+def remove_from_portfolio(ticker: Ticker):
     """Remove stock from portfolio"""
-    memory.remove_from_portfolio(ticker.upper())
-    return {"success": True, "message": f"Removed {ticker.upper()} from portfolio"}
+    memory.remove_from_portfolio(ticker)
+    return {"success": True, "message": f"Removed {ticker} from portfolio"}
 
 # ---------- Watchlist Management ----------
 
 @app.get("/api/watchlist")
-async def get_watchlist():
+def get_watchlist():
     """Get current watchlist"""
     watchlist = memory.get_watchlist()
     return {"watchlist": watchlist}
 
 @app.post("/api/watchlist/add")
-async def add_to_watchlist(stock: StockAction):
+def add_to_watchlist(stock: StockAction):
     """Add stock to watchlist"""
-    memory.add_to_watchlist(stock.ticker.upper())
-    return {"success": True, "message": f"Added {stock.ticker.upper()} to watchlist"}
+    memory.add_to_watchlist(stock.ticker)
+    return {"success": True, "message": f"Added {stock.ticker} to watchlist"}
 
 @app.delete("/api/watchlist/{ticker}")
-async def remove_from_watchlist(ticker: str):
+def remove_from_watchlist(ticker: Ticker):
     """Remove stock from watchlist"""
-    memory.remove_from_watchlist(ticker.upper())
-    return {"success": True, "message": f"Removed {ticker.upper()} from watchlist"}
+    memory.remove_from_watchlist(ticker)
+    return {"success": True, "message": f"Removed {ticker} from watchlist"}
 
 # ---------- Morning Briefing ----------
 
@@ -205,177 +433,205 @@ async def get_morning_wisdom():
     quote = briefing_generator.get_daily_quote()
     return {
         "wisdom": quote["quote"],
-        "date": datetime.now().strftime("%Y-%m-%d")
+        "date": date.today().isoformat()
     }
 
 # ---------- Stock Data ----------
 
 @app.get("/api/stock/{ticker}")
-async def get_stock_info(ticker: str):
+async def get_stock_info(ticker: Ticker):
     """Get detailed info about a specific stock"""
     try:
-        data = await data_aggregator.get_stock_data([ticker.upper()])
-        if ticker.upper() in data:
-            return data[ticker.upper()]
+        data = await cached_stock_data([ticker])
+        if ticker in data:
+            return data[ticker]
         raise HTTPException(status_code=404, detail="Stock not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/stock/{ticker}/score")
-async def get_stock_score(ticker: str):
+async def get_stock_score(ticker: Ticker):
     """Get opportunity score for a stock"""
     try:
-        score = await data_aggregator.calculate_opportunity_score(ticker.upper())
-        return score
+        return await cached_result(
+            f"score:{ticker}", MARKET_TTL,
+            lambda: data_aggregator.calculate_opportunity_score(ticker)
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ---------- Market Data ----------
 
-@app.get("/api/market/indices")
-async def get_market_indices():
-    """Get major market indices"""
+MARKET_INDICES = {
+    'SPY': 'S&P 500',
+    'DIA': 'Dow Jones',
+    'QQQ': 'Nasdaq'
+}
+
+SECTOR_ETFS = {
+    'XLK': 'Technology',
+    'XLF': 'Financial',
+    'XLV': 'Healthcare',
+    'XLE': 'Energy',
+    'XLY': 'Consumer',
+    'XLI': 'Industrial',
+    'XLP': 'Staples',
+    'XLU': 'Utilities',
+    'XLRE': 'Real Estate'
+}
+
+# Use a set of popular stocks for movers
+POPULAR_MOVERS = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'TSLA', 'META', 'NFLX',
+                  'AMD', 'INTC', 'CRM', 'ORCL', 'JPM', 'V', 'MA', 'BAC', 'JNJ', 'PFE']
+
+# Every ticker the market page needs, fetched as one batch
+MARKET_TICKERS = list(dict.fromkeys([*MARKET_INDICES, *SECTOR_ETFS, *POPULAR_MOVERS]))
+
+@app.get("/api/market/overview")
+async def get_market_overview():
+    """Get indices, movers and sectors from a single batched fetch"""
     try:
-        indices = {
-            'SPY': 'S&P 500',
-            'DIA': 'Dow Jones',
-            'QQQ': 'Nasdaq'
-        }
-        data = await data_aggregator.get_stock_data(list(indices.keys()))
-
-        result = []
-        for symbol, name in indices.items():
-            if symbol in data:
-                d = data[symbol]
-                result.append({
-                    'symbol': symbol,
-                    'name': name,
-                    'price': d.get('price', 0),
-                    'change': d.get('change', 0),
-                    'change_pct': d.get('change_pct', 0)
-                })
-        return {'indices': result}
+        return await cached_result("overview", MARKET_TTL, build_market_overview,
+                                   overview_has_quotes)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def build_market_overview():
+    """Fetch every market page ticker at once and split the result per section"""
+    data = await data_aggregator.get_stock_data(MARKET_TICKERS)
+    return {
+        **format_indices(data),
+        **format_movers(data),
+        **format_sectors(data)
+    }
+
+def overview_has_quotes(overview: dict) -> bool:
+    """Whether any index or mover in a market overview came back with a price"""
+    return bool(overview['gainers'] or overview['losers']
+                or any(i['price'] for i in overview['indices']))
+
+def format_indices(data: dict) -> dict:
+    """Shape the major index ETFs"""
+    result = []
+    for symbol, name in MARKET_INDICES.items():
+        if symbol in data:
+            d = data[symbol]
+            result.append({
+                'symbol': symbol,
+                'name': name,
+                'price': d.get('price', 0),
+                'change': d.get('change', 0),
+                'change_pct': d.get('change_pct', 0)
+            })
+    return {'indices': result}
+
+def format_movers(data: dict) -> dict:
+    """Pick the biggest gainers and losers among the popular stocks"""
+    stocks = []
+    for ticker in POPULAR_MOVERS:
+        info = data.get(ticker, {})
+        if info.get('price', 0) > 0:
+            stocks.append({
+                'symbol': ticker,
+                'name': info.get('name', ticker),
+                'price': info.get('price', 0),
+                'change': info.get('change', 0),
+                'change_pct': info.get('change_pct', 0)
+            })
+
+    # Top 5 each way by change percentage - partial selection, no full sorts
+    by_change = itemgetter('change_pct')
+    gainers = heapq.nlargest(5, (s for s in stocks if s['change_pct'] >= 0), key=by_change)
+    losers = heapq.nsmallest(5, (s for s in stocks if s['change_pct'] < 0), key=by_change)
+
+    return {'gainers': gainers, 'losers': losers}
+
+def format_sectors(data: dict) -> dict:
+    """Rank the sector ETFs by change"""
+    result = []
+    for symbol, name in SECTOR_ETFS.items():
+        if symbol in data:
+            d = data[symbol]
+            result.append({
+                'symbol': symbol,
+                'name': name,
+                'change_pct': d.get('change_pct', 0)
+            })
+
+    # Sort by change
+    result.sort(key=lambda x: x['change_pct'], reverse=True)
+    return {'sectors': result}
+
+# The per-section endpoints are views over the same cached batch
+
+@app.get("/api/market/indices")
+async def get_market_indices():
+    """Get major market indices"""
+    overview = await get_market_overview()
+    return {'indices': overview['indices']}
+
 @app.get("/api/market/movers")
 async def get_market_movers():
     """Get top gainers and losers from tracked stocks"""
-    try:
-        # Use a set of popular stocks for movers
-        popular = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'TSLA', 'META', 'NFLX',
-                   'AMD', 'INTC', 'CRM', 'ORCL', 'JPM', 'V', 'MA', 'BAC', 'JNJ', 'PFE']
-
-        data = await data_aggregator.get_stock_data(popular)
-
-        stocks = []
-        for ticker, info in data.items():
-            if info.get('price', 0) > 0:
-                stocks.append({
-                    'symbol': ticker,
-                    'name': info.get('name', ticker),
-                    'price': info.get('price', 0),
-                    'change': info.get('change', 0),
-                    'change_pct': info.get('change_pct', 0)
-                })
-
-        # Sort by change percentage
-        gainers = sorted([s for s in stocks if s['change_pct'] >= 0],
-                        key=lambda x: x['change_pct'], reverse=True)[:5]
-        losers = sorted([s for s in stocks if s['change_pct'] < 0],
-                       key=lambda x: x['change_pct'])[:5]
-
-        return {'gainers': gainers, 'losers': losers}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    overview = await get_market_overview()
+    return {'gainers': overview['gainers'], 'losers': overview['losers']}
 
 @app.get("/api/market/sectors")
 async def get_sector_performance():
     """Get sector performance using sector ETFs"""
-    try:
-        sectors = {
-            'XLK': 'Technology',
-            'XLF': 'Financial',
-            'XLV': 'Healthcare',
-            'XLE': 'Energy',
-            'XLY': 'Consumer',
-            'XLI': 'Industrial',
-            'XLP': 'Staples',
-            'XLU': 'Utilities',
-            'XLRE': 'Real Estate'
-        }
-
-        data = await data_aggregator.get_stock_data(list(sectors.keys()))
-
-        result = []
-        for symbol, name in sectors.items():
-            if symbol in data:
-                d = data[symbol]
-                result.append({
-                    'symbol': symbol,
-                    'name': name,
-                    'change_pct': d.get('change_pct', 0)
-                })
-
-        # Sort by change
-        result.sort(key=lambda x: x['change_pct'], reverse=True)
-        return {'sectors': result}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    overview = await get_market_overview()
+    return {'sectors': overview['sectors']}
 
 @app.get("/api/earnings")
 async def get_earnings_calendar():
     """Get upcoming earnings from Finnhub"""
     try:
         # Get earnings for next 7 days
-        from datetime import timedelta
         today = datetime.now()
         to_date = today + timedelta(days=7)
 
         # Use Finnhub earnings calendar
-        import httpx
         api_key = os.getenv("FINNHUB_API_KEY")
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
+        async with finnhub_limit:
+            response = await http_client.get(
                 "https://finnhub.io/api/v1/calendar/earnings",
                 params={
                     "from": today.strftime("%Y-%m-%d"),
                     "to": to_date.strftime("%Y-%m-%d"),
                     "token": api_key
-                },
-                timeout=10.0
+                }
             )
-            data = response.json()
-
-            earnings = data.get('earningsCalendar', [])
-
-            # Filter to well-known companies and format
-            result = []
-            for e in earnings[:20]:  # Limit to 20
-                if e.get('symbol'):
-                    result.append({
-                        'symbol': e.get('symbol'),
-                        'date': e.get('date'),
-                        'hour': e.get('hour', 'tbd'),  # bmo = before market open, amc = after market close
-                        'estimate': e.get('epsEstimate'),
-                        'year': e.get('year'),
-                        'quarter': e.get('quarter')
-                    })
-
-            return {'earnings': result}
+        data = orjson.loads(response.content)
+
+        earnings = data.get('earningsCalendar', [])
+
+        # Filter to well-known companies and format
+        result = []
+        for e in earnings[:20]:  # Limit to 20
+            if e.get('symbol'):
+                result.append({
+                    'symbol': e.get('symbol'),
+                    'date': e.get('date'),
+                    'hour': e.get('hour', 'tbd'),  # bmo = before market open, amc = after market close
+                    'estimate': e.get('epsEstimate'),
+                    'year': e.get('year'),
+                    'quarter': e.get('quarter')
+                })
+
+        return {'earnings': result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ---------- Settings ----------
 
 @app.get("/api/settings")
-async def get_settings():
+def get_settings():
     """Get user settings and profile"""
     return memory.get_profile()
 
 @app.post("/api/settings")
-async def update_settings(settings: SettingsUpdate):
+def update_settings(settings: SettingsUpdate):
     """Update user settings"""
     if settings.name:
         memory.update_profile(name=settings.name)
@@ -389,11 +645,6 @@ async def update_settings(settings: SettingsUpdate):
 async def transcribe_audio(request: Request):
     """Transcribe audio using Whisper"""
     try:
-        from openai import OpenAI
-        import tempfile
-
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
         # Get audio data from request
         form = await request.form()
         audio_file = form.get("audio")
@@ -401,27 +652,15 @@ async def transcribe_audio(request: Request):
         if not audio_file:
             raise HTTPException(status_code=400, detail="No audio file provided")
 
-        # Read the audio content
-        audio_content = await audio_file.read()
-
-        # Save to a temporary file with proper extension
-        # OpenAI needs the file extension to determine format
-        with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as tmp:
-            tmp.write(audio_content)
-            tmp_path = tmp.name
-
-        try:
-            # Transcribe with Whisper using the file path
-            with open(tmp_path, "rb") as audio:
-                transcript = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio
-                )
-            return {"text": transcript.text}
-        finally:
-            # Clean up temp file
-            import os as os_module
-            os_module.unlink(tmp_path)
+        # Hand Whisper the upload's own spooled file rather than copying it
+        # into memory and a temp file. OpenAI needs the file extension to
+        # determine format, so it goes along as the filename.
+        async with openai_limit:
+            transcript = await get_openai_client().audio.transcriptions.create(
+                model="whisper-1",
+                file=(audio_file.filename or "audio.webm", audio_file.file, audio_file.content_type)
+            )
+        return {"text": transcript.text}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -430,32 +669,33 @@ async def transcribe_audio(request: Request):
 async def synthesize_speech(request: Request):
     """Convert text to speech using ElevenLabs"""
     try:
-        from elevenlabs import ElevenLabs
-
         data = await request.json()
         text = data.get("text", "")
 
         if not text:
             raise HTTPException(status_code=400, detail="No text provided")
 
-        client = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
-
         # Use configured voice or default
         voice_id = os.getenv("ELEVENLABS_VOICE_ID", "21m00Tcm4TlvDq8ikWAM")  # Default: Rachel
 
-        audio = client.generate(
+        audio = await get_elevenlabs_client().generate(
             text=text,
             voice=voice_id,
-            model="eleven_monolingual_v1"
+            model="eleven_monolingual_v1",
+            stream=True
         )
 
-        # Return audio as bytes
-        audio_bytes = b"".join(audio)
+        # Pull the first chunk here so upstream failures still surface as a 500
+        first_chunk = await audio.__anext__()
 
-        return JSONResponse(
-            content={"audio": audio_bytes.hex()},
-            media_type="application/json"
-        )
+        async def audio_stream():
+            yield first_chunk
+            async for chunk in audio:
+                yield chunk
+
+        # Stream raw MP3 bytes as ElevenLabs produces them
+        # MP3 is already compressed
+        return StreamingResponse(audio_stream(), media_type="audio/mpeg", headers=NO_COMPRESSION)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -467,4 +707,14 @@ if os.path.exists(frontend_dir):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Handlers mostly wait on upstream APIs, so several uvloop workers
+    # keep more requests in flight
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "4")),
+        access_log=os.getenv("ACCESS_LOG", "1") == "1"
+    )
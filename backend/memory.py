@@ -3,362 +3,657 @@ Stockman - Memory & Context Management
 Persistent storage using Supabase PostgreSQL
 """
 
+import io
 import os
-import json
-from datetime import datetime
-from typing import List, Dict, Optional
+import re
+import csv
+import copy
+import time
+import atexit
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+import orjson
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.errors
+from psycopg2.extras import (
+    Json, execute_values, register_default_json, register_default_jsonb
+)
+from psycopg2.pool import ThreadedConnectionPool
 
 # Get database URL from environment
 DATABASE_URL = os.environ.get('POSTGRES_URL') or os.environ.get('DATABASE_URL')
+# The pool keeps at most DB_POOL_MIN idle connections open; extra ones
+# opened during a burst are closed when they're returned
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '4'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '10'))
+# Server-side prepared statements. A transaction-mode pooler (pgbouncer,
+# Supabase's port 6543) hands each transaction a different backend, so
+# they're off by default there; DB_PREPARE_STATEMENTS=0/1 overrides
+_TRANSACTION_POOLER = re.compile(r"(:|port=)6543\b|pgbouncer")
+PREPARE_STATEMENTS = os.environ.get(
+    'DB_PREPARE_STATEMENTS',
+    '0' if DATABASE_URL and _TRANSACTION_POOLER.search(DATABASE_URL) else '1'
+) == '1'
+# Set DB_AUTO_MIGRATE=0 to skip schema setup at startup and run
+# `python memory.py` at deploy time instead
+AUTO_MIGRATE = os.environ.get('DB_AUTO_MIGRATE', '1') == '1'
+
+# Schema setup runs at most once per process, however many managers exist
+_schema_ready = False
+
+# psycopg2 already decodes json/jsonb columns (preferences, the full-context
+# document) into Python objects; use orjson for it instead of json.loads
+register_default_json(globally=True, loads=orjson.loads)
+register_default_jsonb(globally=True, loads=orjson.loads)
+
+
+def _json_dumps(value) -> str:
+    """orjson encoder for the Json adapter on the way in"""
+    return orjson.dumps(value).decode()
+
+
+# Rows are plain tuples, unpacked in the column order of the queries below
+
+def _format_profile(row) -> Dict:
+    if row:
+        name, created_at, preferences = row
+        # JSONB - psycopg2 already hands it back as a dict
+        return {"name": name, "created_at": created_at, "preferences": preferences or {}}
+    return {"name": "Friend", "preferences": {}}
+
+
+def _format_messages(rows) -> List[Dict]:
+    # Rows already come in chronological order
+    return [{"role": role, "content": content, "timestamp": timestamp}
+            for role, content, timestamp in rows]
+
+
+def _format_portfolio(rows) -> List[Dict]:
+    return [{
+        "ticker": ticker,
+        "shares": shares,
+        "avg_price": avg_price,
+        "added_at": added_at,
+        "notes": notes
+    } for ticker, shares, avg_price, added_at, notes in rows]
+
+
+def _format_watchlist(rows) -> List[Dict]:
+    return [{
+        "ticker": ticker,
+        "added_at": added_at,
+        "notes": notes
+    } for ticker, added_at, notes in rows]
+
+
+def _format_trades(rows) -> List[Dict]:
+    return [{
+        "ticker": ticker,
+        "action": action,
+        "shares": shares,
+        "price": price,
+        "reason": reason,
+        "timestamp": timestamp
+    } for ticker, action, shares, price, reason, timestamp in rows]
+
+
+def _format_summaries(rows) -> List[Dict]:
+    return [{
+        "week_of": week_of,
+        "summary": summary
+    } for week_of, summary in rows]
+
+
+# Only the columns the formatters use. Dates and times are rendered as text
+# in SQL (matching str() on the Python values), so no datetime objects are
+# built just to be converted back to strings.
+_TIMESTAMP_FORMAT = "YYYY-MM-DD HH24:MI:SS.US"
+
+
+def _ts(column: str) -> str:
+    # str(datetime) drops the fraction when microseconds are 0; .US doesn't
+    return (f"regexp_replace(to_char({column}, '{_TIMESTAMP_FORMAT}'), '[.]000000$', '')"
+            f" AS {column}")
+
+
+_PROFILE_COLUMNS = f"name, {_ts('created_at')}, preferences"
+_MESSAGE_COLUMNS = f"role, content, {_ts('timestamp')}"
+_PORTFOLIO_COLUMNS = f"ticker, shares, avg_price, {_ts('added_at')}, notes"
+_WATCHLIST_COLUMNS = f"ticker, {_ts('added_at')}, notes"
+_TRADE_COLUMNS = f"ticker, action, shares, price, reason, {_ts('timestamp')}"
+_SUMMARY_COLUMNS = "week_of::text AS week_of, summary"
+
+
+# Hot-path statements, prepared once per pooled connection so Postgres skips
+# parsing and planning them on every call
+_STATEMENTS = {
+    "get_profile": f"SELECT {_PROFILE_COLUMNS} FROM profile WHERE id = 1",
+    "insert_message": "INSERT INTO messages (role, content) VALUES (%s, %s)",
+    # Newest N messages, returned oldest first
+    "recent_messages": f"""SELECT {_MESSAGE_COLUMNS} FROM (
+                               SELECT id, role, content, timestamp FROM messages
+                               ORDER BY id DESC LIMIT %s
+                           ) recent ORDER BY id""",
+    "get_portfolio": f"SELECT {_PORTFOLIO_COLUMNS} FROM portfolio ORDER BY ticker",
+    "get_watchlist": f"SELECT {_WATCHLIST_COLUMNS} FROM watchlist ORDER BY ticker",
+    "trade_history": f"SELECT {_TRADE_COLUMNS} FROM trade_history ORDER BY id DESC LIMIT %s",
+    "summaries": f"SELECT {_SUMMARY_COLUMNS} FROM summaries ORDER BY summaries.week_of DESC LIMIT %s",
+}
+
+
+def _prepare_sql(name: str, sql: str) -> str:
+    """PREPARE statement for `sql`, with %s placeholders numbered as $1, $2, ..."""
+    params = iter(range(1, sql.count("%s") + 1))
+    return f"PREPARE {name} AS " + re.sub(r"%s", lambda _: f"${next(params)}", sql)
+
+
+# Connection -> True once _STATEMENTS are prepared on it, False if that
+# failed or they went missing (it then uses plain SQL from there on)
+_prepared = weakref.WeakKeyDictionary()
+
+
+def _execute(cursor, name: str, params: tuple = ()):
+    """Run one of _STATEMENTS, through its prepared plan when the connection has one"""
+    conn = cursor.connection
+    if _prepared.get(conn):
+        args = "(" + ", ".join(["%s"] * len(params)) + ")" if params else ""
+        try:
+            cursor.execute(f"EXECUTE {name}{args}", params)
+            return
+        except psycopg2.errors.InvalidSqlStatementName:
+            # The statements are prepared together, so this only fails as the
+            # first statement of a transaction (landing on a backend that
+            # lacks them); rolling back loses nothing before the plain retry
+            conn.rollback()
+            _prepared[conn] = False
+    cursor.execute(_STATEMENTS[name], params)
+
+
+# The whole schema goes to the server as one batch, so setup is a single
+# round trip on cold start
+_SCHEMA_SQL = """
+-- User profile
+CREATE TABLE IF NOT EXISTS profile (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    name TEXT DEFAULT 'Friend',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    preferences JSONB DEFAULT '{}'
+);
+
+-- Databases created before preferences was JSONB stored it as TEXT
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'profile' AND column_name = 'preferences') = 'text' THEN
+        ALTER TABLE profile ALTER COLUMN preferences DROP DEFAULT;
+        ALTER TABLE profile ALTER COLUMN preferences TYPE JSONB
+            USING COALESCE(NULLIF(preferences, ''), '{}')::jsonb;
+        ALTER TABLE profile ALTER COLUMN preferences SET DEFAULT '{}';
+    END IF;
+END $$;
+
+-- Conversation history
+CREATE TABLE IF NOT EXISTS messages (
+    id SERIAL PRIMARY KEY,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Messages retired from the hot table by archive_messages
+CREATE TABLE IF NOT EXISTS messages_archive (
+    id INTEGER PRIMARY KEY,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TIMESTAMP
+);
+
+-- Portfolio holdings
+CREATE TABLE IF NOT EXISTS portfolio (
+    id SERIAL PRIMARY KEY,
+    ticker TEXT UNIQUE NOT NULL,
+    shares REAL DEFAULT 0,
+    avg_price REAL DEFAULT 0,
+    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    notes TEXT DEFAULT ''
+);
+
+-- Watchlist
+CREATE TABLE IF NOT EXISTS watchlist (
+    id SERIAL PRIMARY KEY,
+    ticker TEXT UNIQUE NOT NULL,
+    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    notes TEXT DEFAULT ''
+);
+
+-- Conversation summaries (for long-term memory)
+CREATE TABLE IF NOT EXISTS summaries (
+    id SERIAL PRIMARY KEY,
+    week_of DATE NOT NULL,
+    summary TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Trade history (what they bought/sold)
+CREATE TABLE IF NOT EXISTS trade_history (
+    id SERIAL PRIMARY KEY,
+    ticker TEXT NOT NULL,
+    action TEXT NOT NULL,
+    shares REAL,
+    price REAL,
+    reason TEXT,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Recent-first reads on summaries. messages and trade_history sort by
+-- their SERIAL id (insertion order) and use the primary key index;
+-- portfolio/watchlist tickers are already indexed by UNIQUE.
+CREATE INDEX IF NOT EXISTS idx_summaries_week ON summaries (week_of DESC);
+
+-- Initialize profile if not exists
+INSERT INTO profile (id, name)
+VALUES (1, 'Friend')
+ON CONFLICT (id) DO NOTHING;
+"""
+
 
 class MemoryManager:
+    # How long a chat snapshot may be reused. Writes through this manager
+    # invalidate it immediately; the TTL bounds staleness from other processes.
+    SNAPSHOT_TTL = 2.0
+    # Same idea for the profile row, which changes far less often
+    PROFILE_TTL = 30.0
+
     def __init__(self):
+        self._version = 0
+        self._snapshot = None
+        # (loaded at, parsed profile row); profile writes clear it
+        self._profile = None
+        # Connections are pooled process-wide so calls skip connect/auth
+        # handshakes. The pool raises when exhausted, so the semaphore makes
+        # worker threads wait for a free connection instead.
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+        atexit.register(self.close)
         self._init_database()
 
-    def _get_connection(self):
-        """Get database connection"""
+    def _changed(self):
+        """Invalidate cached reads after a write"""
+        self._version += 1
+
+    def write_version(self) -> int:
+        """Counter that changes on every write through this manager"""
+        return self._version
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        """Get the connection pool, creating it on first use"""
         if not DATABASE_URL:
             raise Exception("POSTGRES_URL environment variable not set")
-        conn = psycopg2.connect(DATABASE_URL)
-        return conn
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, dsn=DATABASE_URL)
+            return self._pool
+
+    @contextmanager
+    def _cursor(self, prepare: bool = True):
+        """
+        Cursor on a pooled connection. The transaction commits when the
+        block exits and rolls back on error, so no connection goes back to
+        the pool idle in a transaction.
+        """
+        pool = self._get_pool()
+        self._pool_slots.acquire()
+        conn = pool.getconn()
+        broken = False
+        try:
+            if prepare and PREPARE_STATEMENTS and conn not in _prepared:
+                self._prepare_statements(conn)
+            with conn:
+                cursor = conn.cursor()
+                try:
+                    yield cursor
+                finally:
+                    cursor.close()
+        except psycopg2.OperationalError:
+            # Server went away - discard it so the pool opens a fresh one
+            broken = True
+            raise
+        finally:
+            pool.putconn(conn, close=broken or bool(conn.closed))
+            self._pool_slots.release()
+
+    def _prepare_statements(self, conn):
+        """
+        Prepare the hot-path statements on a newly opened connection, in one
+        round trip. Tried once per connection; if it fails, the connection
+        runs plain SQL instead.
+        """
+        try:
+            with conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(";\n".join(
+                        _prepare_sql(name, sql) for name, sql in _STATEMENTS.items()
+                    ))
+            _prepared[conn] = True
+        except psycopg2.errors.DuplicatePreparedStatement:
+            # Backend reused from an earlier session that prepared them already
+            _prepared[conn] = True
+        except psycopg2.OperationalError:
+            raise
+        except psycopg2.Error:
+            _prepared[conn] = False
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._pool_lock:
+            if self._pool is not None and not self._pool.closed:
+                self._pool.closeall()
+            self._pool = None
 
     def _init_database(self):
         """Initialize database tables"""
+        global _schema_ready
         if not DATABASE_URL:
             print("Warning: POSTGRES_URL not set, database operations will fail")
             return
+        if _schema_ready or not AUTO_MIGRATE:
+            return
 
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        # User profile
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS profile (
-                id INTEGER PRIMARY KEY DEFAULT 1,
-                name TEXT DEFAULT 'Friend',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                preferences TEXT DEFAULT '{}'
-            )
-        """)
-
-        # Conversation history
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS messages (
-                id SERIAL PRIMARY KEY,
-                role TEXT NOT NULL,
-                content TEXT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Portfolio holdings
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS portfolio (
-                id SERIAL PRIMARY KEY,
-                ticker TEXT UNIQUE NOT NULL,
-                shares REAL DEFAULT 0,
-                avg_price REAL DEFAULT 0,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                notes TEXT DEFAULT ''
-            )
-        """)
-
-        # Watchlist
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS watchlist (
-                id SERIAL PRIMARY KEY,
-                ticker TEXT UNIQUE NOT NULL,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                notes TEXT DEFAULT ''
-            )
-        """)
-
-        # Conversation summaries (for long-term memory)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS summaries (
-                id SERIAL PRIMARY KEY,
-                week_of DATE NOT NULL,
-                summary TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Trade history (what they bought/sold)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS trade_history (
-                id SERIAL PRIMARY KEY,
-                ticker TEXT NOT NULL,
-                action TEXT NOT NULL,
-                shares REAL,
-                price REAL,
-                reason TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Initialize profile if not exists
-        cursor.execute("""
-            INSERT INTO profile (id, name)
-            VALUES (1, 'Friend')
-            ON CONFLICT (id) DO NOTHING
-        """)
+        # Statements can't be prepared until their tables exist
+        with self._cursor(prepare=False) as cursor:
+            self._create_tables(cursor)
+        _schema_ready = True
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+    def _create_tables(self, cursor):
+        """Create tables and the default profile row"""
+        cursor.execute(_SCHEMA_SQL)
 
     # ============== Profile ==============
 
     def get_profile(self) -> Dict:
-        """Get user profile"""
-        conn = self._get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT * FROM profile WHERE id = 1")
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
-
-        if row:
-            return {
-                "name": row["name"],
-                "created_at": str(row["created_at"]) if row["created_at"] else None,
-                "preferences": json.loads(row["preferences"] or "{}")
-            }
-        return {"name": "Friend", "preferences": {}}
+        """Get user profile, cached for PROFILE_TTL seconds or until it's updated"""
+        cached = self._profile
+        if cached and time.monotonic() - cached[0] < self.PROFILE_TTL:
+            return copy.deepcopy(cached[1])
+
+        # Only cache the row if no write landed while it was being read
+        version = self._version
+        with self._cursor() as cursor:
+            _execute(cursor, "get_profile")
+            row = cursor.fetchone()
+
+        profile = _format_profile(row)
+        if self._version == version:
+            self._profile = (time.monotonic(), copy.deepcopy(profile))
+        return profile
 
     def update_profile(self, name: str = None):
         """Update user profile"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        if name:
-            cursor.execute("UPDATE profile SET name = %s WHERE id = 1", (name,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with self._cursor() as cursor:
+            if name:
+                cursor.execute("UPDATE profile SET name = %s WHERE id = 1", (name,))
+        # Bump the version before dropping the cache so an in-flight
+        # get_profile can't store the row it read before this write
+        self._changed()
+        self._profile = None
 
     def update_preferences(self, preferences: Dict):
         """Update user preferences"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        # Merge with existing preferences
-        current = self.get_profile().get("preferences", {})
-        current.update(preferences)
-
-        cursor.execute(
-            "UPDATE profile SET preferences = %s WHERE id = 1",
-            (json.dumps(current),)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # Merge into the stored preferences in one statement; jsonb || is a
+        # shallow merge, same as dict.update
+        with self._cursor() as cursor:
+            cursor.execute(
+                "UPDATE profile SET preferences = COALESCE(preferences, '{}') || %s WHERE id = 1",
+                (Json(preferences, dumps=_json_dumps),)
+            )
+        self._changed()
+        self._profile = None
 
     # ============== Messages ==============
 
     def add_message(self, role: str, content: str):
         """Add a message to conversation history"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO messages (role, content) VALUES (%s, %s)",
-            (role, content)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with self._cursor() as cursor:
+            _execute(cursor, "insert_message", (role, content))
+        self._changed()
+
+    def add_messages(self, messages: List[Tuple[str, str]]):
+        """Add several (role, content) messages with one multi-row INSERT, in order"""
+        if not messages:
+            return
+        with self._cursor() as cursor:
+            execute_values(
+                cursor,
+                "INSERT INTO messages (role, content) VALUES %s",
+                messages,
+                page_size=100
+            )
+        self._changed()
+
+    def import_messages(self, messages: List[Tuple[str, str]]):
+        """Bulk-load (role, content) messages, e.g. a replayed transcript, via COPY"""
+        buffer = io.StringIO()
+        # Quote every field - in COPY csv an unquoted empty field is NULL
+        csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(messages)
+        buffer.seek(0)
+        with self._cursor() as cursor:
+            cursor.copy_expert("COPY messages (role, content) FROM STDIN WITH (FORMAT csv)", buffer)
+        self._changed()
 
     def get_recent_messages(self, limit: int = 30) -> List[Dict]:
         """Get recent conversation messages"""
-        conn = self._get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(
-            "SELECT role, content, timestamp FROM messages ORDER BY timestamp DESC LIMIT %s",
-            (limit,)
-        )
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        # Return in chronological order
-        messages = [{"role": r["role"], "content": r["content"], "timestamp": str(r["timestamp"])} for r in rows]
-        return list(reversed(messages))
-
-    def get_message_count(self) -> int:
-        """Get total message count"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM messages")
-        count = cursor.fetchone()[0]
-        cursor.close()
-        conn.close()
+        with self._cursor() as cursor:
+            _execute(cursor, "recent_messages", (limit,))
+            rows = cursor.fetchall()
+
+        return _format_messages(rows)
+
+    def archive_messages(self, older_than_days: int = 90) -> int:
+        """
+        Move messages older than `older_than_days` into messages_archive so
+        the hot table (and its index) stays small. Weekly summaries carry
+        the long-term memory. Returns the number of messages moved.
+        """
+        with self._cursor() as cursor:
+            cursor.execute(
+                """WITH retired AS (
+                       DELETE FROM messages
+                       WHERE timestamp < CURRENT_TIMESTAMP - make_interval(days => %s)
+                       RETURNING id, role, content, timestamp
+                   )
+                   INSERT INTO messages_archive (id, role, content, timestamp)
+                   SELECT id, role, content, timestamp FROM retired""",
+                (older_than_days,)
+            )
+            moved = cursor.rowcount
+        self._changed()
+        return moved
+
+    # Below this many rows an exact COUNT(*) is cheap enough to always run
+    EXACT_COUNT_LIMIT = 10000
+
+    def get_message_count(self, exact: bool = False) -> int:
+        """
+        Get total message count. Uses the planner's row estimate for large
+        tables unless `exact` is set; small or never-analyzed tables are
+        always counted exactly.
+        """
+        with self._cursor() as cursor:
+            if not exact:
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = 'messages'::regclass")
+                estimate = cursor.fetchone()[0]
+                if estimate >= self.EXACT_COUNT_LIMIT:
+                    return estimate
+            cursor.execute("SELECT COUNT(*) FROM messages")
+            count = cursor.fetchone()[0]
         return count
 
     # ============== Portfolio ==============
 
     def get_portfolio(self) -> List[Dict]:
         """Get current portfolio"""
-        conn = self._get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT * FROM portfolio ORDER BY ticker")
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        return [{
-            "ticker": r["ticker"],
-            "shares": r["shares"],
-            "avg_price": r["avg_price"],
-            "added_at": str(r["added_at"]) if r["added_at"] else None,
-            "notes": r["notes"]
-        } for r in rows]
+        with self._cursor() as cursor:
+            _execute(cursor, "get_portfolio")
+            rows = cursor.fetchall()
+
+        return _format_portfolio(rows)
+
+    def get_portfolio_soa(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Get portfolio as parallel (tickers, shares, avg_price) arrays"""
+        with self._cursor() as cursor:
+            cursor.execute(
+                "SELECT ticker, COALESCE(shares, 0), COALESCE(avg_price, 0) FROM portfolio ORDER BY ticker"
+            )
+            rows = cursor.fetchall()
+
+        tickers = [r[0] for r in rows]
+        shares = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+        avg_prices = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+        return tickers, shares, avg_prices
 
     def add_to_portfolio(self, ticker: str, shares: float = 0, price: float = 0):
         """Add or update portfolio position"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """INSERT INTO portfolio (ticker, shares, avg_price)
-               VALUES (%s, %s, %s)
-               ON CONFLICT(ticker) DO UPDATE SET
-               shares = portfolio.shares + EXCLUDED.shares,
-               avg_price = EXCLUDED.avg_price""",
-            (ticker, shares or 0, price or 0)
-        )
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with self._cursor() as cursor:
+            cursor.execute(
+                # Average cost is weighted by shares. Re-adding with 0 shares
+                # sets the cost basis to the given price; buying without a
+                # price (0) or selling (negative shares) leaves it alone.
+                """INSERT INTO portfolio (ticker, shares, avg_price)
+                   VALUES (%s, %s, %s)
+                   ON CONFLICT(ticker) DO UPDATE SET
+                   avg_price = CASE
+                       WHEN EXCLUDED.shares = 0 THEN EXCLUDED.avg_price
+                       WHEN EXCLUDED.shares < 0 OR EXCLUDED.avg_price = 0 THEN portfolio.avg_price
+                       ELSE COALESCE(
+                           (COALESCE(portfolio.shares, 0) * COALESCE(portfolio.avg_price, 0)
+                            + EXCLUDED.shares * EXCLUDED.avg_price)
+                           / NULLIF(COALESCE(portfolio.shares, 0) + EXCLUDED.shares, 0),
+                           EXCLUDED.avg_price)
+                   END,
+                   shares = COALESCE(portfolio.shares, 0) + EXCLUDED.shares""",
+                (ticker, shares or 0, price or 0)
+            )
+        self._changed()
 
     def remove_from_portfolio(self, ticker: str):
         """Remove stock from portfolio"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM portfolio WHERE ticker = %s", (ticker,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with self._cursor() as cursor:
+            cursor.execute("DELETE FROM portfolio WHERE ticker = %s", (ticker,))
+        self._changed()
 
     # ============== Watchlist ==============
 
     def get_watchlist(self) -> List[Dict]:
         """Get current watchlist"""
-        conn = self._get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT * FROM watchlist ORDER BY ticker")
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        return [{
-            "ticker": r["ticker"],
-            "added_at": str(r["added_at"]) if r["added_at"] else None,
-            "notes": r["notes"]
-        } for r in rows]
+        with self._cursor() as cursor:
+            _execute(cursor, "get_watchlist")
+            rows = cursor.fetchall()
+
+        return _format_watchlist(rows)
 
     def add_to_watchlist(self, ticker: str, notes: str = ""):
         """Add stock to watchlist"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            """INSERT INTO watchlist (ticker, notes) VALUES (%s, %s)
-               ON CONFLICT (ticker) DO NOTHING""",
-            (ticker, notes)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with self._cursor() as cursor:
+            cursor.execute(
+                """INSERT INTO watchlist (ticker, notes) VALUES (%s, %s)
+                   ON CONFLICT (ticker) DO NOTHING""",
+                (ticker, notes)
+            )
+        self._changed()
 
     def remove_from_watchlist(self, ticker: str):
         """Remove stock from watchlist"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM watchlist WHERE ticker = %s", (ticker,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with self._cursor() as cursor:
+            cursor.execute("DELETE FROM watchlist WHERE ticker = %s", (ticker,))
+        self._changed()
 
     # ============== Trade History ==============
 
     def log_trade(self, ticker: str, action: str, shares: float = None,
                   price: float = None, reason: str = None):
         """Log a trade action"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            """INSERT INTO trade_history (ticker, action, shares, price, reason)
-               VALUES (%s, %s, %s, %s, %s)""",
-            (ticker, action, shares, price, reason)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with self._cursor() as cursor:
+            cursor.execute(
+                """INSERT INTO trade_history (ticker, action, shares, price, reason)
+                   VALUES (%s, %s, %s, %s, %s)""",
+                (ticker, action, shares, price, reason)
+            )
+        self._changed()
 
     def get_trade_history(self, limit: int = 50) -> List[Dict]:
         """Get trade history"""
-        conn = self._get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(
-            "SELECT * FROM trade_history ORDER BY timestamp DESC LIMIT %s",
-            (limit,)
-        )
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        return [{
-            "ticker": r["ticker"],
-            "action": r["action"],
-            "shares": r["shares"],
-            "price": r["price"],
-            "reason": r["reason"],
-            "timestamp": str(r["timestamp"]) if r["timestamp"] else None
-        } for r in rows]
+        with self._cursor() as cursor:
+            _execute(cursor, "trade_history", (limit,))
+            rows = cursor.fetchall()
+
+        return _format_trades(rows)
 
     # ============== Summaries ==============
 
     def add_weekly_summary(self, summary: str):
         """Add weekly conversation summary"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        week_of = datetime.now().strftime("%Y-%m-%d")
-        cursor.execute(
-            "INSERT INTO summaries (week_of, summary) VALUES (%s, %s)",
-            (week_of, summary)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with self._cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO summaries (week_of, summary) VALUES (CURRENT_DATE, %s)",
+                (summary,)
+            )
+        self._changed()
 
     def get_summaries(self, limit: int = 10) -> List[Dict]:
         """Get recent summaries"""
-        conn = self._get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(
-            "SELECT * FROM summaries ORDER BY week_of DESC LIMIT %s",
-            (limit,)
-        )
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        return [{
-            "week_of": str(r["week_of"]) if r["week_of"] else None,
-            "summary": r["summary"]
-        } for r in rows]
-
-    # ============== Full Context ==============
-
-    def get_full_context(self) -> Dict:
-        """Get full context for AI prompt"""
-        return {
-            "profile": self.get_profile(),
-            "recent_messages": self.get_recent_messages(30),
-            "portfolio": self.get_portfolio(),
-            "watchlist": self.get_watchlist(),
-            "preferences": self.get_profile().get("preferences", {}),
-            "summaries": self.get_summaries(5),
-            "trade_history": self.get_trade_history(20)
+        with self._cursor() as cursor:
+            _execute(cursor, "summaries", (limit,))
+            rows = cursor.fetchall()
+
+        return _format_summaries(rows)
+
+    # ============== Chat Context ==============
+
+    def get_chat_snapshot(self, message_limit: int = 10) -> Dict:
+        """
+        Get profile, portfolio, watchlist and recent messages for chat in one
+        connection. Reused for SNAPSHOT_TTL seconds until the next write.
+        """
+        key = (self._version, message_limit)
+        cached = self._snapshot
+        if cached and cached[0] == key and time.monotonic() - cached[1] < self.SNAPSHOT_TTL:
+            return copy.deepcopy(cached[2])
+
+        profile = self.get_profile()
+        with self._cursor() as cursor:
+            _execute(cursor, "get_portfolio")
+            portfolio = _format_portfolio(cursor.fetchall())
+            _execute(cursor, "get_watchlist")
+            watchlist = _format_watchlist(cursor.fetchall())
+            _execute(cursor, "recent_messages", (message_limit,))
+            recent_messages = _format_messages(cursor.fetchall())
+
+        snapshot = {
+            "profile": profile,
+            "portfolio": portfolio,
+            "watchlist": watchlist,
+            "recent_messages": recent_messages,
+            "preferences": profile.get("preferences", {})
         }
+        # Callers get their own copy, so mutating one can't change the cache
+        self._snapshot = (key, time.monotonic(), copy.deepcopy(snapshot))
+        return snapshot
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Deploy-time migration: create or upgrade the schema, then exit.
+    # `python memory.py archive [days]` also retires old messages (for cron).
+    AUTO_MIGRATE = True
+    manager = MemoryManager()
+    print("Database schema is up to date")
+    if sys.argv[1:2] == ["archive"]:
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else 90
+        print(f"Archived {manager.archive_messages(days)} messages older than {days} days")
+    manager.close()
@@ -143,20 +143,31 @@ async function sendMessage() {
     showTyping();
 
     try {
-        const response = await fetch(`${API_BASE}/api/chat`, {
+        const response = await fetch(`${API_BASE}/api/chat/stream`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ message, is_voice: false })
         });
-
-        const data = await response.json();
-
-        // Hide typing before showing response
+        if (!response.ok) throw new Error(`Chat failed: ${response.status}`);
+
+        // Render the reply as it streams in
+        let reply = '';
+        let messageDiv = null;
+        await readEventStream(response, event => {
+            if (event.error) throw new Error(event.error);
+            if (!event.delta) return;
+
+            reply += event.delta;
+            if (!messageDiv) {
+                // Hide typing before showing response
+                hideTyping();
+                messageDiv = addMessage('assistant', reply);
+            } else {
+                messageDiv.querySelector('.message-content').innerHTML = formatMessage(reply);
+                elements.chatContainer.scrollTop = elements.chatContainer.scrollHeight;
+            }
+        });
         hideTyping();
-
-        if (data.reply) {
-            addMessage('assistant', data.reply);
-        }
     } catch (error) {
         console.error('Chat error:', error);
         hideTyping();
@@ -189,6 +200,30 @@ function addMessage(role, content) {
 
     // Scroll to bottom
     elements.chatContainer.scrollTop = elements.chatContainer.scrollHeight;
+
+    return messageDiv;
+}
+
+async function readEventStream(response, onEvent) {
+    // Minimal server-sent events reader for fetch responses
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const event of events) {
+            if (event.startsWith('data: ')) {
+                onEvent(JSON.parse(event.slice(6)));
+            }
+        }
+    }
 }
 
 // ============================================
@@ -317,12 +352,10 @@ async function speakResponse(text) {
         });
 
         if (response.ok) {
-            const { audio } = await response.json();
+            const audioBlob = await response.blob();
 
-            if (audio) {
-                // Convert hex to ArrayBuffer and play
-                const bytes = new Uint8Array(audio.match(/.{1,2}/g).map(byte => parseInt(byte, 16)));
-                const audioBlob = new Blob([bytes], { type: 'audio/mpeg' });
+            if (audioBlob.size > 0) {
+                // Response body is the MP3 itself
                 const audioUrl = URL.createObjectURL(audioBlob);
 
                 const audioElement = new Audio(audioUrl);
@@ -857,21 +890,21 @@ function switchPage(page) {
 // ============================================
 
 async function loadMarketData() {
-    // Load all market data in parallel
+    // One batched request feeds all three sections
+    const overview = fetch(`${API_BASE}/api/market/overview`).then(r => r.json());
     Promise.all([
-        loadIndices(),
-        loadMovers(),
-        loadSectors()
+        loadIndices(overview),
+        loadMovers(overview),
+        loadSectors(overview)
     ]).catch(console.error);
 }
 
-async function loadIndices() {
+async function loadIndices(overview) {
     const grid = document.getElementById('indices-grid');
     if (!grid) return;
 
     try {
-        const response = await fetch(`${API_BASE}/api/market/indices`);
-        const { indices } = await response.json();
+        const { indices } = await overview;
 
         grid.innerHTML = indices.map(idx => {
             const isUp = idx.change_pct >= 0;
@@ -889,14 +922,13 @@ async function loadIndices() {
     }
 }
 
-async function loadMovers() {
+async function loadMovers(overview) {
     const gainersList = document.getElementById('gainers-list');
     const losersList = document.getElementById('losers-list');
     if (!gainersList || !losersList) return;
 
     try {
-        const response = await fetch(`${API_BASE}/api/market/movers`);
-        const { gainers, losers } = await response.json();
+        const { gainers, losers } = await overview;
 
         gainersList.innerHTML = gainers.length > 0
             ? gainers.map(s => renderMoverItem(s, true)).join('')
@@ -929,13 +961,12 @@ function renderMoverItem(stock, isGainer) {
     `;
 }
 
-async function loadSectors() {
+async function loadSectors(overview) {
     const grid = document.getElementById('sectors-grid');
     if (!grid) return;
 
     try {
-        const response = await fetch(`${API_BASE}/api/market/sectors`);
-        const { sectors } = await response.json();
+        const { sectors } = await overview;
 
         grid.innerHTML = sectors.map(sector => {
             const isUp = sector.change_pct >= 0;